@@ -0,0 +1,20 @@
+import numpy as np
+from variantOptimizer import selection_vector
+
+
+def bottlenecks(graph, player_ingredients, requests, variant_choices=None):
+    """
+    Rank the items that limit the plan: for every item the requests are short of, the reduction in
+    total shortfall per extra unit in the inventory (its shadow price), computed for all items from
+    one netting pass and one reverse pass over the recipe graph instead of one re-plan per item.
+    Returns (item name, shortfall reduction per unit) pairs, largest first.
+    """
+    inventory = graph.mint_vector(player_ingredients)
+    selection = selection_vector(graph, variant_choices or {})
+    result = graph.net(inventory, *graph.order_vectors(requests), selection)
+    prices = graph.shadow_prices(result, inventory, selection)[0]
+    table = []
+    for index in np.flatnonzero(prices > 0):
+        value = round(float(prices[index]), 6)
+        table.append((graph.names[index], int(value) if value.is_integer() else value))
+    return sorted(table, key=lambda row: (-row[1], row[0]))
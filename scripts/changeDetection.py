@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import os
+from urllib.parse import quote
+import metrics
+from incrementalPlan import file_stamp
+
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files/{}"
+SHEETS_VALUES_URL = "https://sheets.googleapis.com/v4/spreadsheets/{}/values/{}"
+
+
+# Revision of the whole spreadsheet from its Drive file metadata. 'version' increases on every edit,
+# including edits made by updateProfile.py to ACCOUNT_RESOURCES, so wallet refreshes are picked up too.
+class DriveRevisionSource:
+    def __init__(self, client, spreadsheet_id):
+        self.client = client
+        self.spreadsheet_id = spreadsheet_id
+
+    def current_revision(self):
+        with metrics.timed_request('sheets', backend='drive', operation='revision'):
+            response = self.client.request(
+                'get',
+                DRIVE_FILES_URL.format(self.spreadsheet_id),
+                params={'fields': 'version,modifiedTime', 'supportsAllDrives': True}
+            )
+        metadata = response.json()
+        return f"{metadata.get('version')}:{metadata.get('modifiedTime')}"
+
+
+# Value of a single cell holding a checksum formula over the input ranges, e.g. PROFILE!D1.
+# Unlike the Drive revision it does not change when this script writes RecipeCalcs.
+class ChecksumCellSource:
+    def __init__(self, client, spreadsheet_id, cell):
+        self.client = client
+        self.spreadsheet_id = spreadsheet_id
+        self.cell = cell
+
+    def current_revision(self):
+        with metrics.timed_request('sheets', backend='sheets', operation='read'):
+            response = self.client.request('get', SHEETS_VALUES_URL.format(self.spreadsheet_id, quote(self.cell)))
+        values = response.json().get('values', [])
+        return values[0][0] if values and values[0] else ''
+
+
+# Local stand-in for the spreadsheet, used for testing: the revision is the hash of a local file.
+class LocalFileRevisionSource:
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def current_revision(self):
+        try:
+            with open(self.file_path, 'rb') as file:
+                return hashlib.sha256(file.read()).hexdigest()
+        except OSError:
+            return None
+
+
+def make_revision_source(mode, client, spreadsheet_id, cell=None, local_file=None):
+    mode = (mode or 'off').strip().lower()
+    if mode == 'drive':
+        return DriveRevisionSource(client, spreadsheet_id)
+    if mode == 'cell' and cell:
+        return ChecksumCellSource(client, spreadsheet_id, cell)
+    if mode == 'local' and local_file:
+        return LocalFileRevisionSource(local_file)
+    if mode != 'off':
+        logging.warning(f"Change detection mode '{mode}' is missing its settings, change detection disabled")
+    return None
+
+
+def current_inputs_stamp(revision_source, local_files):
+    # Returns None when the revision cannot be read, which never matches a stored stamp
+    try:
+        revision = revision_source.current_revision()
+    except Exception as e:
+        logging.warning(f"Failed to read spreadsheet revision, running without change detection: {e}")
+        return None
+    return {
+        'spreadsheet': revision,
+        'files': {file_path: file_stamp(file_path) for file_path in local_files}
+    }
+
+
+def _state_key(spreadsheet_id):
+    # JSON object keys are strings; runs on local inputs have no spreadsheet id
+    return spreadsheet_id or 'local'
+
+
+def load_last_run(state_file, spreadsheet_id):
+    try:
+        with open(state_file, 'r', encoding='utf-8') as file:
+            return json.load(file).get(_state_key(spreadsheet_id))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable last run state at {state_file}: {e}")
+        return None
+
+
+def save_last_run(state_file, spreadsheet_id, stamp):
+    try:
+        with open(state_file, 'r', encoding='utf-8') as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        state = {}
+    state[_state_key(spreadsheet_id)] = stamp
+
+    temp_path = f"{state_file}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(state, file, indent=2)
+        os.replace(temp_path, state_file)
+    except OSError as e:
+        logging.error(f"Failed to save last run state to {state_file}: {e}")
+
+
+def inputs_unchanged(stamp, state_file, spreadsheet_id):
+    """
+    Pre-flight check on the stamp from current_inputs_stamp, which costs a single API call (none for
+    the local stand-in). Returns whether the spreadsheet and the local recipe files are unchanged
+    since the last successful run.
+    """
+    if stamp is None:
+        return False
+    return stamp == load_last_run(state_file, spreadsheet_id)
+
+
+def record_successful_run(state_file, spreadsheet_id, stamp):
+    """
+    Store the stamp read before the run, so an edit made while the run was in progress still counts
+    as a change next time. A Drive revision also moves with the run's own writes, so the run after a
+    publishing run is not skipped; it finds its results already published in the result memo, writes
+    nothing and records a revision the following runs can be skipped on.
+    """
+    if stamp is None:
+        return
+    save_last_run(state_file, spreadsheet_id, stamp)
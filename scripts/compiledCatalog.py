@@ -0,0 +1,324 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+from functools import lru_cache
+import metrics
+from rawCraftingData import iter_raw_crafting_data
+
+# Bump whenever the layout of CompiledCatalog changes in a way the source hash below does not catch
+CATALOG_CODE_VERSION = 2
+# Modules whose code builds the artifact, including the unit BOMs cached in it, relative to this file
+CATALOG_CODE_SOURCES = ('compiledCatalog.py', 'rawCraftingData.py', os.path.join('planner', 'ingredients.py'))
+
+
+def hash_file(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def catalog_code_version():
+    # CATALOG_CODE_VERSION plus a hash of CATALOG_CODE_SOURCES, so an artifact built by other code is rebuilt
+    directory = os.path.dirname(os.path.abspath(__file__))
+    sha256 = hashlib.sha256()
+    for source in CATALOG_CODE_SOURCES:
+        sha256.update(hash_file(os.path.join(directory, source)).encode('ascii'))
+    return f"{CATALOG_CODE_VERSION}:{sha256.hexdigest()[:16]}"
+
+
+# Everything the planner derives from craftingDataFormat.json and galaxyNFTsData.json, compiled once
+# and persisted so later runs do not have to parse the source JSON again.
+class CompiledCatalog:
+    def __init__(self, crafting_data, nft_data):
+        self.mint_to_name = {nft['mint']: nft['name'] for nft in nft_data}
+        self.name_to_mint = {name: mint for mint, name in self.mint_to_name.items()}
+
+        # Recipes keyed by the name of their output, or their namespace when the mint has no name
+        self.parsed_crafting_data = {}
+        for item in crafting_data:
+            item_name = self.mint_to_name.get(item['key'], item['data']['namespace'])
+            self.parsed_crafting_data[item_name] = item
+
+        # Recipe graph over mints
+        self.recipes = {}
+        self.producers = {}
+        for recipe_name, item in self.parsed_crafting_data.items():
+            output = item.get('output')
+            if not output:
+                continue
+            data = item['data']
+            self.recipes[recipe_name] = {
+                'output_mint': output['mint'],
+                'output_amount': max(int(output['amount']), 1),
+                'inputs': [(ingredient['mint'], int(ingredient['amount'])) for ingredient in item.get('ingredients', [])],
+                'duration': int(data.get('duration') or 0),
+                'fee': float(data.get('feeAmount') or 0),
+                'version': data.get('version')
+            }
+            self.producers.setdefault(output['mint'], []).append(recipe_name)
+        for recipe_names in self.producers.values():
+            recipe_names.sort()
+
+        # Alternative recipes for the same output, e.g. Crystal Lattice 1, 2 and 3
+        self.variant_groups = {
+            self.mint_to_name.get(mint, mint): recipe_names
+            for mint, recipe_names in sorted(self.producers.items()) if len(recipe_names) > 1
+        }
+        self.mint_order = self._topological_mint_order()
+
+        # Content hash per recipe, including the names of its mints, to tell which recipes a refresh changed
+        self.recipe_fingerprints = {
+            recipe_name: self._recipe_fingerprint(item) for recipe_name, item in self.parsed_crafting_data.items()
+        }
+
+        # Unit ingredient totals per crystal lattice recipe and requested item
+        self.unit_boms = {}
+
+    def _recipe_fingerprint(self, item):
+        output = item.get('output')
+        output_name = self.mint_to_name.get(output['mint'], output['mint']) if output else None
+        mint_names = sorted({
+            (mint, self.mint_to_name.get(mint))
+            for mint in [ingredient['mint'] for ingredient in item.get('ingredients', [])] + ([output['mint']] if output else [])
+        })
+        content = json.dumps([item, mint_names], sort_keys=True, default=str)
+        return {
+            'output': output_name,
+            'version': item.get('data', {}).get('version'),
+            'hash': hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+        }
+
+    def changed_recipes(self, previous_fingerprints):
+        # Recipes added, removed or changed since the catalog the fingerprints were taken from
+        previous_fingerprints = previous_fingerprints or {}
+        return {
+            recipe_name for recipe_name in set(previous_fingerprints) | set(self.recipe_fingerprints)
+            if previous_fingerprints.get(recipe_name) != self.recipe_fingerprints.get(recipe_name)
+        }
+
+    def affected_items(self, previous_fingerprints):
+        """
+        Items whose ingredient expansion can differ from the one computed against previous_fingerprints:
+        the changed recipes themselves and every item that uses one of them, directly or through
+        intermediates. Items are the keys of parsed_crafting_data, as used for unit BOMs and plan state.
+        """
+        previous_fingerprints = previous_fingerprints or {}
+        changed = self.changed_recipes(previous_fingerprints)
+        if not changed:
+            return set()
+
+        # Item name -> items that use it as an ingredient, either by name or through a recipe for its mint
+        consumers = {}
+        for item_name, item in self.parsed_crafting_data.items():
+            for ingredient in item.get('ingredients', []):
+                ingredient_name = self.mint_to_name.get(ingredient['mint'], ingredient['mint'])
+                dependencies = {ingredient_name, *self.producers.get(ingredient['mint'], []), *self.variant_groups.get(ingredient_name, [])}
+                for dependency in dependencies:
+                    consumers.setdefault(dependency, set()).add(item_name)
+
+        # A changed recipe also changes what its output resolves to, including outputs of removed recipes
+        affected = set(changed)
+        for recipe_name in changed:
+            for fingerprints in (previous_fingerprints, self.recipe_fingerprints):
+                if fingerprints.get(recipe_name, {}).get('output'):
+                    affected.add(fingerprints[recipe_name]['output'])
+        pending = list(affected)
+        while pending:
+            for consumer in consumers.get(pending.pop(), ()):
+                if consumer not in affected:
+                    affected.add(consumer)
+                    pending.append(consumer)
+        return affected
+
+    def _topological_mint_order(self):
+        # Products before their ingredients; edges closing a cycle are ignored
+        graph_mints = set(self.producers)
+        for recipe in self.recipes.values():
+            graph_mints.update(mint for mint, _ in recipe['inputs'])
+
+        visited = set()
+        postorder = []
+        for root in sorted(graph_mints):
+            if root in visited:
+                continue
+            visited.add(root)
+            stack = [(root, iter(self._input_mints(root)))]
+            while stack:
+                mint, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    postorder.append(mint)
+                elif child not in visited:
+                    visited.add(child)
+                    stack.append((child, iter(self._input_mints(child))))
+        postorder.reverse()
+        return postorder
+
+    def _input_mints(self, mint):
+        return sorted({
+            input_mint
+            for recipe_name in self.producers.get(mint, [])
+            for input_mint, _ in self.recipes[recipe_name]['inputs']
+        })
+
+    def nft_records(self):
+        # Minimal stand-in for the NFT dump, for functions that only look at mint and name
+        return [{'mint': mint, 'name': name} for mint, name in self.mint_to_name.items()]
+
+    def precompute_unit_boms(self, unit_contribution, previous=None):
+        # Unit BOMs of items no recipe change can reach are taken over from the previous catalog
+        reusable = {}
+        if previous is not None:
+            affected = self.affected_items(previous.recipe_fingerprints)
+            reusable = {
+                crystal_recipe: {item_name: bom for item_name, bom in boms.items() if item_name not in affected}
+                for crystal_recipe, boms in previous.unit_boms.items()
+            }
+
+        crystal_recipes = self.variant_groups.get('Crystal Lattice') or [None]
+        computed = 0
+        for crystal_recipe in crystal_recipes:
+            previous_boms = reusable.get(crystal_recipe, {})
+            self.unit_boms[crystal_recipe] = {}
+            for item_name in self.parsed_crafting_data:
+                if item_name in previous_boms:
+                    self.unit_boms[crystal_recipe][item_name] = previous_boms[item_name]
+                else:
+                    self.unit_boms[crystal_recipe][item_name] = unit_contribution(item_name, self.parsed_crafting_data, self.mint_to_name, crystal_recipe)
+                    computed += 1
+        logging.info(f"Computed {computed} unit BOMs, reused {len(crystal_recipes) * len(self.parsed_crafting_data) - computed}")
+
+    def unit_bom(self, item_name, crystal_recipe):
+        return self.unit_boms.get(crystal_recipe, {}).get(item_name)
+
+
+def _source_stamps(source_paths, previous_stamps=None):
+    # Hash every source file, reusing the stored hash when size and mtime are unchanged
+    previous_stamps = previous_stamps or {}
+    stamps = {}
+    for role, file_path in source_paths.items():
+        stat = os.stat(file_path)
+        previous = previous_stamps.get(role)
+        if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+            sha256 = previous['sha256']
+        else:
+            sha256 = hash_file(file_path)
+        stamps[role] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+    return stamps
+
+
+def _stamps_match(stamps, other):
+    return other is not None and stamps.keys() == other.keys() and all(
+        stamps[role]['sha256'] == other[role]['sha256'] for role in stamps
+    )
+
+
+def read_catalog_header(artifact_path):
+    try:
+        with open(artifact_path, 'rb') as file:
+            return pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable compiled catalog at {artifact_path}: {e}")
+        return None
+
+
+def load_catalog_artifact(artifact_path):
+    with open(artifact_path, 'rb') as file:
+        pickle.load(file)  # Skip the header
+        return pickle.load(file)
+
+
+def write_catalog_artifact(artifact_path, catalog, stamps):
+    header = {'code_version': catalog_code_version(), 'sources': stamps}
+    temp_path = f"{artifact_path}.tmp"
+    with open(temp_path, 'wb') as file:
+        pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(catalog, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, artifact_path)
+
+
+def load_nft_names(nft_data_path):
+    """
+    The mint and name of every record of the NFT dump. Each object is cut down to those two keys
+    as soon as it is parsed, so the attributes, media and market data of the dump are never held
+    in memory all at once.
+    """
+    def mint_and_name(pairs):
+        return {key: value for key, value in pairs if key in ('mint', 'name')}
+
+    with open(nft_data_path, 'r', encoding='utf-8') as file:
+        return json.load(file, object_pairs_hook=mint_and_name)
+
+
+def build_catalog(crafting_data_path, nft_data_path, unit_contribution=None, crafting_data_format='format', previous=None):
+    logging.info(f"Compiling catalog from {crafting_data_path} and {nft_data_path}")
+    if crafting_data_format == 'raw':
+        # Recipes decoded straight from craftingDataRaw.json while it is read
+        crafting_data = iter_raw_crafting_data(crafting_data_path)
+    else:
+        with open(crafting_data_path, 'r', encoding='utf-8') as file:
+            crafting_data = json.load(file)
+    catalog = CompiledCatalog(crafting_data, load_nft_names(nft_data_path))
+    if unit_contribution is not None:
+        catalog.precompute_unit_boms(unit_contribution, previous)
+    if previous is not None:
+        logging.info(f"{len(catalog.changed_recipes(previous.recipe_fingerprints))} recipes changed since the previous catalog")
+    logging.info(f"Compiled catalog with {len(catalog.recipes)} recipes and {len(catalog.variant_groups)} variant groups")
+    return catalog
+
+
+def load_or_build_catalog(crafting_data_path, nft_data_path, artifact_path, unit_contribution=None, force_rebuild=False, crafting_data_format='format'):
+    """
+    Load the compiled catalog artifact if it was built by the current code (catalog_code_version) from
+    the current source files, otherwise rebuild it from the source JSON and write a fresh artifact. crafting_data_format
+    is 'format' for craftingDataFormat.json or 'raw' for craftingDataRaw.json.
+    Returns None when the source files cannot be read.
+    """
+    crafting_data_role = 'crafting_data_raw' if crafting_data_format == 'raw' else 'crafting_data'
+    source_paths = {crafting_data_role: crafting_data_path, 'nft_data': nft_data_path}
+    header = read_catalog_header(artifact_path)
+    previous_stamps = header.get('sources') if isinstance(header, dict) else None
+
+    try:
+        stamps = _source_stamps(source_paths, previous_stamps)
+    except OSError as e:
+        logging.error(f"Error reading catalog source files: {e}")
+        return None
+
+    if not force_rebuild and header is not None and header.get('code_version') == catalog_code_version() and _stamps_match(stamps, previous_stamps):
+        try:
+            catalog = load_catalog_artifact(artifact_path)
+            logging.info(f"Loaded compiled catalog from {artifact_path}")
+            return catalog
+        except Exception as e:
+            logging.warning(f"Failed to load compiled catalog from {artifact_path}, rebuilding: {e}")
+
+    # Unit BOMs of recipes the refresh did not touch are reused from the previous artifact
+    previous = None
+    if not force_rebuild and header is not None and header.get('code_version') == catalog_code_version():
+        try:
+            previous = load_catalog_artifact(artifact_path)
+        except Exception as e:
+            logging.warning(f"Failed to load the previous compiled catalog from {artifact_path}: {e}")
+
+    try:
+        catalog = build_catalog(crafting_data_path, nft_data_path, unit_contribution, crafting_data_format, previous)
+        metrics.inc('planner_catalog_builds_total')
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Error compiling catalog: {e}")
+        return None
+
+    try:
+        write_catalog_artifact(artifact_path, catalog, stamps)
+        logging.info(f"Wrote compiled catalog to {artifact_path}")
+    except OSError as e:
+        logging.warning(f"Failed to write compiled catalog to {artifact_path}: {e}")
+    return catalog
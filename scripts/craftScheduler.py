@@ -0,0 +1,98 @@
+import heapq
+import logging
+import numpy as np
+
+
+def _split_batches(crafts, batch_size):
+    if not batch_size or batch_size >= crafts:
+        return [crafts]
+    full_batches, remainder = divmod(crafts, batch_size)
+    return [batch_size] * full_batches + ([remainder] if remainder else [])
+
+
+def schedule_crafts(graph, crafts, slots=1, batch_size=0):
+    """
+    Schedule the crafts of an expanded plan on a number of crafting slots. Every recipe's crafts are
+    split into jobs of at most batch_size crafts (0 keeps them in one job) that take the recipe
+    duration per craft. A recipe's jobs can start once every recipe producing one of its ingredients
+    has finished. Jobs are list scheduled by critical path: whenever a slot is free it takes the
+    ready job with the longest chain of work still depending on it.
+    crafts is the per-recipe crafts vector of a NettingResult row.
+    """
+    slots = max(int(slots), 1)
+    crafts = np.asarray(crafts).ravel()
+    catalog = graph.catalog
+    planned = [int(r) for r in np.flatnonzero(crafts)]
+    if not planned:
+        return {'jobs': [], 'makespan': 0, 'total_fees': 0.0, 'slots': slots, 'utilization': 0.0}
+
+    recipes = {r: catalog.recipes[graph.recipe_names[r]] for r in planned}
+    batches = {r: _split_batches(int(crafts[r]), batch_size) for r in planned}
+
+    # Recipe level dependencies; edges that close a cycle in the topological order are dropped
+    producers_of = {}
+    for r in planned:
+        producers_of.setdefault(graph.recipe_outputs[r], []).append(r)
+    dependencies = {r: set() for r in planned}
+    consumers = {r: set() for r in planned}
+    for r in planned:
+        for input_index, _ in graph.recipe_inputs[r]:
+            for producer in producers_of.get(input_index, []):
+                if producer != r and input_index > graph.recipe_outputs[r]:
+                    dependencies[r].add(producer)
+                    consumers[producer].add(r)
+
+    # Critical path priority: the longest chain of work from a recipe to the end of the plan
+    priority = {}
+    for r in sorted(planned, key=lambda r: graph.recipe_outputs[r]):
+        longest_batch = max(batches[r]) * recipes[r]['duration']
+        priority[r] = longest_batch + max((priority.get(consumer, 0) for consumer in consumers[r]), default=0)
+
+    ready = []
+    remaining_dependencies = {r: len(dependencies[r]) for r in planned}
+    remaining_batches = {r: len(batches[r]) for r in planned}
+
+    def release(r):
+        for batch_index, batch_crafts in enumerate(batches[r]):
+            heapq.heappush(ready, (-priority[r], graph.recipe_names[r], batch_index, r, batch_crafts))
+
+    for r in planned:
+        if not remaining_dependencies[r]:
+            release(r)
+
+    free_slots = list(range(1, slots + 1))
+    running = []
+    jobs = []
+    time = 0
+    busy_time = 0
+    while ready or running:
+        while ready and free_slots:
+            _, recipe_name, _, r, batch_crafts = heapq.heappop(ready)
+            slot = heapq.heappop(free_slots)
+            duration = batch_crafts * recipes[r]['duration']
+            heapq.heappush(running, (time + duration, slot, r))
+            busy_time += duration
+            jobs.append({
+                'recipe': recipe_name,
+                'crafts': batch_crafts,
+                'slot': slot,
+                'start': time,
+                'finish': time + duration,
+                'fee': batch_crafts * recipes[r]['fee']
+            })
+
+        finish, slot, r = heapq.heappop(running)
+        time = finish
+        heapq.heappush(free_slots, slot)
+        remaining_batches[r] -= 1
+        if not remaining_batches[r]:
+            for consumer in consumers[r]:
+                remaining_dependencies[consumer] -= 1
+                if not remaining_dependencies[consumer]:
+                    release(consumer)
+
+    makespan = max(job['finish'] for job in jobs)
+    total_fees = sum(job['fee'] for job in jobs)
+    utilization = busy_time / (slots * makespan) if makespan else 0.0
+    logging.info(f"Scheduled {len(jobs)} craft jobs on {slots} slots: makespan {makespan}s, fees {total_fees:.8f} ATLAS, utilization {utilization:.1%}")
+    return {'jobs': jobs, 'makespan': makespan, 'total_fees': total_fees, 'slots': slots, 'utilization': utilization}
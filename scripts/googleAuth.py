@@ -0,0 +1,91 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import gspread
+import requests
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2 import service_account
+from requests.adapters import HTTPAdapter
+
+GOOGLE_SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+# One authorized client per credentials file and process, so every Sheets call reuses its connections
+_clients = {}
+
+
+def _cache_key(credentials):
+    return hashlib.sha256(f"{credentials.service_account_email}|{' '.join(sorted(GOOGLE_SCOPES))}".encode('utf-8')).hexdigest()
+
+
+def _load_cached_token(credentials, cache_file, refresh_margin):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as file:
+            cached = json.load(file)
+        if cached.get('key') != _cache_key(credentials):
+            return False
+        # google-auth keeps expiry as a naive UTC datetime
+        expiry = datetime.datetime.fromisoformat(cached['expiry'])
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning(f"Ignoring unreadable token cache {cache_file}: {e}")
+        return False
+
+    if expiry - datetime.timedelta(seconds=refresh_margin) <= datetime.datetime.utcnow():
+        return False
+    credentials.token = cached['token']
+    credentials.expiry = expiry
+    return True
+
+
+def _save_cached_token(credentials, cache_file):
+    temp_path = f"{cache_file}.tmp"
+    cached = {'key': _cache_key(credentials), 'token': credentials.token, 'expiry': credentials.expiry.isoformat()}
+    try:
+        # Only the owner may read the token
+        descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump(cached, file)
+        os.chmod(temp_path, 0o600)
+        os.replace(temp_path, cache_file)
+    except OSError as e:
+        logging.warning(f"Failed to write token cache {cache_file}: {e}")
+
+
+def load_credentials(credentials_file, session, cache_file=None, refresh_margin=300):
+    """
+    Service account credentials with a valid access token. A token cached in cache_file by an earlier
+    run is reused until refresh_margin seconds before it expires, otherwise a new one is requested and
+    cached. No token is cached without a cache_file.
+    """
+    credentials = service_account.Credentials.from_service_account_file(credentials_file, scopes=GOOGLE_SCOPES)
+    if cache_file and _load_cached_token(credentials, cache_file, refresh_margin):
+        logging.info("Reusing cached Google access token")
+        return credentials
+
+    credentials.refresh(Request(session))
+    logging.info("Requested a new Google access token")
+    if cache_file:
+        _save_cached_token(credentials, cache_file)
+    return credentials
+
+
+def authorize(credentials_file, token_cache_file=None, refresh_margin=300, pool_size=10):
+    """
+    gspread client for the service account in credentials_file. All Sheets and Drive calls of the
+    process go through one keep-alive session with up to pool_size connections.
+    """
+    if credentials_file in _clients:
+        return _clients[credentials_file]
+
+    token_session = requests.Session()
+    credentials = load_credentials(credentials_file, token_session, token_cache_file, refresh_margin)
+
+    # Later token refreshes go through the same token session
+    session = AuthorizedSession(credentials, auth_request=Request(token_session))
+    session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    client = gspread.Client(auth=credentials, session=session)
+    _clients[credentials_file] = client
+    return client
@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+
+
+def file_stamp(file_path):
+    # Cheap identity of an input file: size plus modification time.
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def add_scaled(totals, vector, factor):
+    # Add factor * vector into totals, dropping entries that cancel out to zero.
+    for name, qty in vector.items():
+        new_qty = totals.get(name, 0) + qty * factor
+        if new_qty:
+            totals[name] = new_qty
+        else:
+            totals.pop(name, None)
+
+
+# Keeps the per-request contributions of the previous run on disk so that, when a player edits a
+# few DASHBOARD rows, only those rows are re-expanded.
+class IncrementalPlan:
+    def __init__(self, state_file):
+        self.state_file = state_file
+        self.context = None
+        self.requests = {}  # normalized item name -> requested quantity
+        self.units = {}  # normalized item name -> {'initial': {}, 'raw': {}, 'full': {}} for one unit
+        self.totals = {'initial': {}, 'raw': {}, 'full': {}}
+        self.recipe_fingerprints = {}  # catalog recipe fingerprints the units were computed with
+        self.expanded_items = 0
+
+    def load(self, context, catalog=None):
+        """
+        Load the previous run's state. The state is only reused when it was computed under the same
+        context (variant choices); otherwise the plan starts cold. When a catalog is given, only the
+        items whose dependency cone contains a recipe changed since the previous run are invalidated.
+        """
+        self.context = context
+        if catalog is not None:
+            self.recipe_fingerprints = catalog.recipe_fingerprints
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            logging.info(f"No previous plan state at {self.state_file}, starting from a cold plan")
+            return False
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable plan state at {self.state_file}: {e}")
+            return False
+
+        if state.get('context') != context:
+            logging.info("Planning context changed since the last run, starting from a cold plan")
+            return False
+
+        self.requests = state['requests']
+        self.units = state['units']
+        self.totals = state['totals']
+        logging.info(f"Loaded previous plan state with {len(self.requests)} requested items")
+        if catalog is not None:
+            self.invalidate(catalog.affected_items(state.get('recipe_fingerprints')))
+        return True
+
+    def invalidate(self, affected_items):
+        # Drop the contributions of affected items so update_requests expands them again
+        for item in sorted(affected_items & set(self.units)):
+            unit = self.units.pop(item)
+            for kind, vector in unit.items():
+                add_scaled(self.totals[kind], vector, -self.requests[item])
+            del self.requests[item]
+        if affected_items:
+            logging.info(f"Recipe changes invalidated {len(affected_items)} items")
+
+    def save(self):
+        state = {
+            'context': self.context,
+            'requests': self.requests,
+            'units': self.units,
+            'totals': self.totals,
+            'recipe_fingerprints': self.recipe_fingerprints
+        }
+        temp_path = f"{self.state_file}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(state, file)
+            os.replace(temp_path, self.state_file)
+        except OSError as e:
+            logging.error(f"Failed to save plan state to {self.state_file}: {e}")
+
+    def update_requests(self, requests, unit_contribution):
+        """
+        Apply the difference between the previous and the new request quantities to the consolidated
+        initial, raw and full totals. unit_contribution(item) is only called for items that were not
+        requested in the previous run. Returns the initial ingredients whose totals changed.
+        """
+        changed_ingredients = set()
+        for item in sorted(set(self.requests) | set(requests)):
+            delta = requests.get(item, 0) - self.requests.get(item, 0)
+            if delta == 0:
+                continue
+
+            unit = self.units.get(item)
+            if unit is None:
+                unit = unit_contribution(item)
+                self.units[item] = unit
+                self.expanded_items += 1
+
+            for kind, vector in unit.items():
+                add_scaled(self.totals[kind], vector, delta)
+            changed_ingredients.update(unit['initial'])
+
+        self.requests = {item: qty for item, qty in requests.items() if qty}
+        self.units = {item: unit for item, unit in self.units.items() if item in self.requests}
+        logging.info(f"Expanded {self.expanded_items} new items, {len(changed_ingredients)} initial ingredients changed")
+        return changed_ingredients
@@ -0,0 +1,135 @@
+import logging
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    wallet TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    changed_mints INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_wallet_time ON snapshots (wallet, taken_at);
+
+-- Only the mints whose amount changed since the wallet's previous snapshot; NULL means the mint is gone
+CREATE TABLE IF NOT EXISTS deltas (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id),
+    mint TEXT NOT NULL,
+    amount TEXT,
+    PRIMARY KEY (snapshot_id, mint)
+);
+CREATE INDEX IF NOT EXISTS deltas_mint ON deltas (mint, snapshot_id);
+
+-- Latest holdings per wallet, so a new snapshot is diffed without replaying the deltas
+CREATE TABLE IF NOT EXISTS holdings (
+    wallet TEXT NOT NULL,
+    mint TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    PRIMARY KEY (wallet, mint)
+);
+"""
+
+
+# Time series of wallet holdings (mint -> amount string as returned by the RPC node), stored as
+# deltas against the wallet's previous snapshot.
+class InventoryHistory:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def latest_holdings(self, wallet):
+        rows = self.connection.execute("SELECT mint, amount FROM holdings WHERE wallet = ?", (wallet,))
+        return dict(rows.fetchall())
+
+    def changes(self, wallet, holdings):
+        # {mint: (previous amount, new amount)} against the latest snapshot, None for missing mints
+        previous = self.latest_holdings(wallet)
+        return {
+            mint: (previous.get(mint), holdings.get(mint))
+            for mint in previous.keys() | holdings.keys()
+            if previous.get(mint) != holdings.get(mint)
+        }
+
+    def record_snapshot(self, wallet, holdings, taken_at=None):
+        """
+        Store a snapshot of the wallet's holdings, keeping only the mints that changed.
+        Returns the snapshot id and the changes as returned by changes().
+        """
+        holdings = {mint: str(amount) for mint, amount in holdings.items()}
+        taken_at = time.time() if taken_at is None else taken_at
+        changes = self.changes(wallet, holdings)
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO snapshots (wallet, taken_at, changed_mints) VALUES (?, ?, ?)",
+                (wallet, taken_at, len(changes))
+            )
+            snapshot_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT INTO deltas (snapshot_id, mint, amount) VALUES (?, ?, ?)",
+                [(snapshot_id, mint, new) for mint, (_, new) in sorted(changes.items())]
+            )
+            self.connection.executemany(
+                "DELETE FROM holdings WHERE wallet = ? AND mint = ?",
+                [(wallet, mint) for mint, (_, new) in changes.items() if new is None]
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO holdings (wallet, mint, amount) VALUES (?, ?, ?)",
+                [(wallet, mint, new) for mint, (_, new) in changes.items() if new is not None]
+            )
+        logging.info(f"Recorded inventory snapshot {snapshot_id} for {wallet} with {len(changes)} changed mints")
+        return snapshot_id, changes
+
+    def holdings_at(self, wallet, at):
+        # Holdings as of the last snapshot taken at or before the given time, rebuilt from the deltas
+        rows = self.connection.execute(
+            """
+            SELECT d.mint, d.amount FROM deltas d JOIN snapshots s ON s.id = d.snapshot_id
+            WHERE s.wallet = ? AND s.taken_at <= ?
+            ORDER BY s.taken_at, s.id
+            """,
+            (wallet, at)
+        )
+        holdings = {}
+        for mint, amount in rows:
+            if amount is None:
+                holdings.pop(mint, None)
+            else:
+                holdings[mint] = amount
+        return holdings
+
+    def mint_history(self, wallet, mint):
+        # [(time, amount)] for every change of one mint, None when it left the wallet
+        rows = self.connection.execute(
+            """
+            SELECT s.taken_at, d.amount FROM deltas d JOIN snapshots s ON s.id = d.snapshot_id
+            WHERE d.mint = ? AND s.wallet = ?
+            ORDER BY s.taken_at, s.id
+            """,
+            (mint, wallet)
+        )
+        return rows.fetchall()
+
+    def diff(self, wallet, since, until=None):
+        # {mint: (amount at since, amount at until)} for the mints that differ, until defaults to now
+        before = self.holdings_at(wallet, since)
+        after = self.latest_holdings(wallet) if until is None else self.holdings_at(wallet, until)
+        return {
+            mint: (before.get(mint), after.get(mint))
+            for mint in before.keys() | after.keys()
+            if before.get(mint) != after.get(mint)
+        }
+
+    def changed_mints_since(self, wallet, since):
+        rows = self.connection.execute(
+            """
+            SELECT DISTINCT d.mint FROM deltas d JOIN snapshots s ON s.id = d.snapshot_id
+            WHERE s.wallet = ? AND s.taken_at > ?
+            """,
+            (wallet, since)
+        )
+        return {mint for (mint,) in rows}
@@ -0,0 +1,266 @@
+import json
+import logging
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+import requests
+import metrics
+import updateProfile
+from compiledCatalog import load_nft_names
+from planner import Planner, PlannerConfig, PlannerError
+from planner.script import init_script
+
+TOKEN_PROGRAM_ID = 'TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA'
+# SPL token accounts are 165 bytes with the owner's public key at offset 32
+TOKEN_ACCOUNT_SIZE = 165
+TOKEN_ACCOUNT_OWNER_OFFSET = 32
+
+
+def fetch_token_accounts(rpc_url, wallet_address):
+    # {token account: (mint, uiAmountString)} of every SPL token account owned by the wallet, at the
+    # same commitment as the subscription so a resync does not roll back notified changes
+    payload = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "getTokenAccountsByOwner",
+        "params": [wallet_address, {"programId": TOKEN_PROGRAM_ID}, {"encoding": "jsonParsed", "commitment": "confirmed"}]
+    }
+    with metrics.timed_request('rpc', method='getTokenAccountsByOwner'):
+        response = requests.post(rpc_url, headers={'Content-Type': 'application/json'}, json=payload)
+        accounts = response.json()['result']['value']
+    token_accounts = {}
+    for account in accounts:
+        info = account['account']['data']['parsed']['info']
+        token_accounts[account['pubkey']] = (info['mint'], info['tokenAmount']['uiAmountString'])
+    return token_accounts
+
+
+def program_subscribe_request(wallet_address, request_id=1):
+    # Notifications for every token account owned by the wallet, parsed like getTokenAccountsByOwner
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "programSubscribe",
+        "params": [
+            TOKEN_PROGRAM_ID,
+            {
+                "encoding": "jsonParsed",
+                "commitment": "confirmed",
+                "filters": [
+                    {"dataSize": TOKEN_ACCOUNT_SIZE},
+                    {"memcmp": {"offset": TOKEN_ACCOUNT_OWNER_OFFSET, "bytes": wallet_address}}
+                ]
+            }
+        ]
+    }
+
+
+# Holdings of one wallet kept up to date from programSubscribe notifications. Holds no connection,
+# so the notification handling and debouncing can be driven by tests with plain messages and times.
+# Changes are due to be written once nothing changed for debounce seconds, and at the latest
+# max_delay seconds after the first unwritten change.
+class WalletHoldings:
+    def __init__(self, wallet_address, debounce=5.0, max_delay=30.0):
+        self.wallet_address = wallet_address
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.token_accounts = {}
+        self.dirty_since = None
+        self.last_change = None
+
+    def reset(self, token_accounts, now):
+        # Replace the holdings with a full snapshot; written out if anything differs
+        changed = self.by_mint() != self._by_mint(token_accounts)
+        self.token_accounts = dict(token_accounts)
+        if changed:
+            self._mark_dirty(now)
+        return changed
+
+    def apply_notification(self, message, now):
+        """
+        Apply one programNotification. Returns True when the holdings changed. Accounts that were
+        closed, emptied of data or moved to another owner are removed.
+        """
+        if message.get('method') != 'programNotification':
+            return False
+        value = message['params']['result']['value']
+        account_pubkey = value['pubkey']
+        account = value.get('account') or {}
+        data = account.get('data')
+        info = data.get('parsed', {}).get('info', {}) if isinstance(data, dict) else {}
+
+        if account.get('lamports', 0) == 0 or info.get('owner') != self.wallet_address or 'tokenAmount' not in info:
+            entry = None
+        else:
+            entry = (info['mint'], info['tokenAmount']['uiAmountString'])
+
+        if self.token_accounts.get(account_pubkey) == entry:
+            return False
+        if entry is None:
+            del self.token_accounts[account_pubkey]
+        else:
+            self.token_accounts[account_pubkey] = entry
+        self._mark_dirty(now)
+        return True
+
+    def _mark_dirty(self, now):
+        if self.dirty_since is None:
+            self.dirty_since = now
+        self.last_change = now
+
+    def flush_due(self, now):
+        if self.dirty_since is None:
+            return False
+        return now - self.last_change >= self.debounce or now - self.dirty_since >= self.max_delay
+
+    def next_flush_at(self):
+        if self.dirty_since is None:
+            return None
+        return min(self.last_change + self.debounce, self.dirty_since + self.max_delay)
+
+    def mark_flushed(self):
+        self.dirty_since = None
+        self.last_change = None
+
+    def retry_later(self, now):
+        # The write failed; try again once another debounce interval has passed
+        self.dirty_since = now
+        self.last_change = now
+
+    def by_mint(self):
+        return self._by_mint(self.token_accounts)
+
+    @staticmethod
+    def _by_mint(token_accounts):
+        # mint -> amount string as fetch_blockchain_data returns it, summed over accounts of the same mint
+        amounts = {}
+        for mint, amount in token_accounts.values():
+            amounts.setdefault(mint, []).append(amount)
+        holdings = {}
+        for mint, mint_amounts in amounts.items():
+            if len(mint_amounts) == 1:
+                holdings[mint] = mint_amounts[0]
+                continue
+            try:
+                total = sum(Decimal(amount) for amount in mint_amounts)
+                holdings[mint] = format(total.normalize(), 'f')
+            except InvalidOperation:
+                holdings[mint] = mint_amounts[0]
+        return holdings
+
+
+def publish_holdings(holdings, account_resources_sheet, nft_data, config):
+    # Same output as a updateProfile.py refresh; returns 'updated' like the runs of the other scripts
+    blockchain_data = holdings.by_mint()
+    final_data = updateProfile.compare_and_merge_data(blockchain_data, nft_data, config)
+    updateProfile.post_to_google_sheets(final_data, account_resources_sheet, config.account_data_fetch_range)
+    updateProfile.record_inventory_snapshot(config.inventory_history_db, holdings.wallet_address, blockchain_data, nft_data)
+    metrics.inc('planner_inventory_stream_flushes_total')
+    logging.info(f"Wrote {len(final_data)} holdings to {config.account_data_fetch_sheet}")
+    return 'updated'
+
+
+def stream_holdings(holdings, ws_url, rpc_url, publish, stop=None, resync_interval=3600.0, ping_interval=30.0, max_backoff=60.0):
+    """
+    Keep holdings current from a programSubscribe websocket and call publish(holdings) once changes
+    settle; publish returns 'queued' when the write could not be made now and is retried after
+    another debounce interval (see runLock.single_flight). The holdings are resynced over RPC after every (re)connect and every resync_interval
+    seconds (0 for only on reconnect), in case a notification was missed. Reconnects with exponential
+    backoff up to max_backoff seconds; runs until stop() returns True.
+    """
+    from websockets.sync.client import connect
+    from websockets.exceptions import WebSocketException
+
+    backoff = 1
+    while not (stop and stop()):
+        try:
+            with connect(ws_url, max_size=None) as connection:
+                connection.send(json.dumps(program_subscribe_request(holdings.wallet_address)))
+                # Snapshot after subscribing, so no change falls between the two
+                holdings.reset(fetch_token_accounts(rpc_url, holdings.wallet_address), time.monotonic())
+                last_resync = last_ping = time.monotonic()
+                backoff = 1
+                logging.info(f"Subscribed to token accounts of {holdings.wallet_address} at {ws_url}")
+
+                while not (stop and stop()):
+                    now = time.monotonic()
+                    if holdings.flush_due(now):
+                        try:
+                            if publish(holdings) == 'queued':
+                                logging.info(f"Another run is pending on the spreadsheet, writing holdings in {holdings.debounce}s")
+                                holdings.retry_later(now)
+                            else:
+                                holdings.mark_flushed()
+                        except Exception as e:
+                            logging.error(f"Failed to write holdings, retrying in {holdings.debounce}s: {e}")
+                            holdings.retry_later(now)
+                    if resync_interval and now - last_resync >= resync_interval:
+                        if holdings.reset(fetch_token_accounts(rpc_url, holdings.wallet_address), now):
+                            logging.warning("Resync found changes the subscription missed")
+                        last_resync = now
+                    if now - last_ping >= ping_interval:
+                        connection.ping()
+                        last_ping = now
+
+                    # Wait for the next notification, but no longer than the next flush or ping
+                    deadlines = [last_ping + ping_interval, holdings.next_flush_at()]
+                    timeout = max(min(deadline for deadline in deadlines if deadline is not None) - now, 0.05)
+                    try:
+                        message = json.loads(connection.recv(timeout=timeout))
+                    except TimeoutError:
+                        continue
+                    if 'error' in message:
+                        raise ValueError(f"Subscription failed: {message['error']}")
+                    if holdings.apply_notification(message, time.monotonic()):
+                        metrics.inc('planner_inventory_stream_changes_total')
+        except (OSError, WebSocketException, ValueError, KeyError, requests.RequestException) as e:
+            metrics.inc('planner_inventory_stream_reconnects_total')
+            logging.warning(f"Inventory stream disconnected ({type(e).__name__}: {e}), reconnecting in {backoff}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
+
+    # Changes received before stopping are still written
+    if holdings.dirty_since is not None:
+        if publish(holdings) == 'queued':
+            logging.warning("Another run is pending on the spreadsheet, the last holdings were not written")
+        holdings.mark_flushed()
+
+
+def main():
+    init_script()
+    config = PlannerConfig.from_env()
+    nft_data = updateProfile.convert_nft_data_to_dict(load_nft_names(config.galaxy_nfts_data))
+    planner = Planner(config)
+    try:
+        client = planner.client
+    except PlannerError as e:
+        logging.error(f"{e}. Exiting.")
+        sys.exit(1)
+    player_profile_sheet = updateProfile.get_worksheet(client, config.spreadsheet_id, config.player_profile_sheet)
+    account_resources_sheet = updateProfile.get_worksheet(client, config.spreadsheet_id, config.account_data_fetch_sheet)
+    if player_profile_sheet is None or account_resources_sheet is None:
+        sys.exit(1)
+    wallet_address = player_profile_sheet.acell(config.wallet_lookup_key).value
+    ws_url = config.node_ws_host or (config.node_rpc_host or '').replace('https://', 'wss://', 1).replace('http://', 'ws://', 1)
+
+    metrics.start_http_server(config.metrics_port, config.metrics_host)
+    holdings = WalletHoldings(wallet_address, config.inventory_stream_debounce, config.inventory_stream_max_delay)
+
+    def publish(changed_holdings):
+        # Every write takes the spreadsheet's run lock, like the runs of the other scripts
+        return planner.single_flight('stream', lambda: publish_holdings(changed_holdings, account_resources_sheet, nft_data, config))
+
+    try:
+        stream_holdings(holdings, ws_url, config.node_rpc_host, publish,
+                        resync_interval=config.inventory_stream_resync_interval,
+                        ping_interval=config.inventory_stream_ping_interval,
+                        max_backoff=config.inventory_stream_max_backoff)
+    except KeyboardInterrupt:
+        logging.info("Inventory stream stopped")
+        if holdings.dirty_since is not None:
+            publish(holdings)
+    metrics.write_textfile(config.metrics_textfile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from inventoryStream import TOKEN_PROGRAM_ID
+from planner.script import init_script
+
+# Rent-exempt balance of a token account; a closed account has none
+TOKEN_ACCOUNT_LAMPORTS = 2039280
+
+
+def load_holdings(holdings_file):
+    # {mint: amount string} from a JSON object such as {"<mint>": "12.5"}
+    with open(holdings_file, 'r', encoding='utf-8') as file:
+        return {mint: str(amount) for mint, amount in json.load(file).items()}
+
+
+def token_account(owner, mint, amount):
+    # A token account as getTokenAccountsByOwner and programSubscribe return it with jsonParsed
+    if amount is None:
+        return {'lamports': 0, 'owner': TOKEN_PROGRAM_ID, 'data': None}
+    return {
+        'lamports': TOKEN_ACCOUNT_LAMPORTS,
+        'owner': TOKEN_PROGRAM_ID,
+        'data': {
+            'program': 'spl-token',
+            'parsed': {'type': 'account', 'info': {'mint': mint, 'owner': owner, 'tokenAmount': {'uiAmountString': amount}}}
+        }
+    }
+
+
+def account_pubkey(owner, mint):
+    # One token account per wallet and mint
+    return f"{owner[:16]}-{mint[:16]}"
+
+
+# Stand-in for the Solana node of updateProfile.py and inventoryStream.py, serving the holdings of a
+# local JSON file to any wallet that asks: getTokenAccountsByOwner over HTTP and programSubscribe over
+# a websocket. Edits of the file are sent to the subscribers as programNotifications.
+class LocalNode:
+    def __init__(self, holdings_file):
+        self.holdings_file = holdings_file
+        self.holdings = load_holdings(holdings_file)
+        self.slot = 1
+        self.subscribers = {}  # connection -> (subscription id, wallet address)
+        self.last_subscription = 0
+        self.lock = threading.Lock()
+
+    def rpc(self, request):
+        if request.get('method') != 'getTokenAccountsByOwner':
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}}
+        owner = request['params'][0]
+        with self.lock:
+            value = [
+                {'pubkey': account_pubkey(owner, mint), 'account': token_account(owner, mint, amount)}
+                for mint, amount in self.holdings.items()
+            ]
+            slot = self.slot
+        return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': {'context': {'slot': slot}, 'value': value}}
+
+    def serve_subscriber(self, connection):
+        request = json.loads(connection.recv())
+        if request.get('method') != 'programSubscribe':
+            connection.send(json.dumps({'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}}))
+            return
+        # The owner filter names the wallet, see inventoryStream.program_subscribe_request
+        filters = request['params'][1].get('filters', [])
+        owner = next(entry['memcmp']['bytes'] for entry in filters if 'memcmp' in entry)
+        with self.lock:
+            self.last_subscription += 1
+            subscription = self.last_subscription
+            self.subscribers[connection] = (subscription, owner)
+        connection.send(json.dumps({'jsonrpc': '2.0', 'id': request.get('id'), 'result': subscription}))
+        logging.info(f"Subscription {subscription} for {owner}")
+        try:
+            # Nothing else is expected from the client; wait until it disconnects
+            for _ in connection:
+                pass
+        finally:
+            with self.lock:
+                del self.subscribers[connection]
+
+    def reload(self):
+        # Notify the subscribers of every mint whose amount changed since the file was last read
+        holdings = load_holdings(self.holdings_file)
+        with self.lock:
+            changed = {mint: holdings.get(mint) for mint in set(holdings) | set(self.holdings) if holdings.get(mint) != self.holdings.get(mint)}
+            self.holdings = holdings
+            self.slot += 1
+            slot = self.slot
+            subscribers = list(self.subscribers.items())
+        for mint, amount in changed.items():
+            for connection, (subscription, owner) in subscribers:
+                notification = {
+                    'jsonrpc': '2.0',
+                    'method': 'programNotification',
+                    'params': {
+                        'subscription': subscription,
+                        'result': {'context': {'slot': slot}, 'value': {'pubkey': account_pubkey(owner, mint), 'account': token_account(owner, mint, amount)}}
+                    }
+                }
+                try:
+                    connection.send(json.dumps(notification))
+                except Exception as e:
+                    logging.warning(f"Failed to notify subscription {subscription}: {e}")
+        if changed:
+            logging.info(f"Sent {len(changed)} changed holdings to {len(subscribers)} subscribers")
+
+    def watch(self, poll_seconds, stop=None):
+        # Reload the holdings file whenever its modification time changes
+        modified = os.path.getmtime(self.holdings_file)
+        while not (stop and stop()):
+            time.sleep(poll_seconds)
+            try:
+                current = os.path.getmtime(self.holdings_file)
+                if current != modified:
+                    modified = current
+                    self.reload()
+            except (OSError, ValueError) as e:
+                logging.warning(f"Failed to reload {self.holdings_file}: {e}")
+
+
+class LocalRpcHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            response = self.server.node.rpc(json.loads(self.rfile.read(length)))
+        except (ValueError, KeyError, IndexError) as e:
+            response = {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': f"Invalid request: {e}"}}
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def start_local_node(holdings_file, host='127.0.0.1', rpc_port=8899, ws_port=8900, poll_seconds=1.0):
+    """
+    Serve holdings_file on host in background threads. Returns the node, its RPC and websocket URLs
+    and a function that stops it; ports of 0 pick free ones.
+    """
+    from websockets.sync.server import serve
+
+    node = LocalNode(holdings_file)
+    rpc_server = ThreadingHTTPServer((host, rpc_port), LocalRpcHandler)
+    rpc_server.node = node
+    ws_server = serve(node.serve_subscriber, host, ws_port)
+    stopped = threading.Event()
+    for target in (rpc_server.serve_forever, ws_server.serve_forever, lambda: node.watch(poll_seconds, stopped.is_set)):
+        threading.Thread(target=target, daemon=True).start()
+
+    def stop():
+        stopped.set()
+        rpc_server.shutdown()
+        rpc_server.server_close()
+        ws_server.shutdown()
+
+    rpc_url = f"http://{host}:{rpc_server.server_address[1]}"
+    ws_url = f"ws://{host}:{ws_server.socket.getsockname()[1]}"
+    return node, rpc_url, ws_url, stop
+
+
+def main():
+    init_script()
+    parser = argparse.ArgumentParser(description="Serve wallet holdings from a JSON file like a Solana node, for updateProfile.py and inventoryStream.py")
+    parser.add_argument('holdings_file', help='JSON object of mint -> amount; edits are sent to inventoryStream.py subscribers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--rpc-port', type=int, default=8899)
+    parser.add_argument('--ws-port', type=int, default=8900)
+    parser.add_argument('--poll-seconds', type=float, default=1.0, help='How often the holdings file is checked for edits')
+    args = parser.parse_args()
+
+    _, rpc_url, ws_url, stop = start_local_node(args.holdings_file, args.host, args.rpc_port, args.ws_port, args.poll_seconds)
+    logging.info(f"Local node serving {args.holdings_file}: NODE_RPC_HOST={rpc_url} NODE_WS_HOST={ws_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        logging.info("Local node stopped")
+    finally:
+        stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import logging
+import numpy as np
+from variantOptimizer import selection_vector
+
+# Upper bound on the number of crafts searched for a single recipe
+MAX_CRAFTS_SEARCHED = 2 ** 32
+
+
+def max_craftable(graph, player_ingredients, variant_choices=None):
+    """
+    Maximum quantity of every recipe's output that can be crafted from the player's inventory,
+    counting intermediates crafted from sub-ingredients. All recipes are searched at once: each
+    recipe is a row of the batched netting, the number of crafts is doubled until the inventory no
+    longer covers it and then bisected, so the whole catalog takes about 2 * log2(max crafts) passes.
+    Intermediate variant groups use variant_choices. Returns (recipe name, quantity) pairs ranked by
+    quantity; recipes without ingredients are left out since they are not bounded by inventory.
+    """
+    inventory = graph.mint_vector(player_ingredients)
+    selection = selection_vector(graph, variant_choices or {})
+    recipes = np.array([r for r, inputs in enumerate(graph.recipe_inputs) if inputs], dtype=np.int64)
+    if len(recipes) == 0:
+        return []
+
+    def feasible(rows, crafts):
+        # Whether crafts[i] crafts of recipes[rows[i]] leave no raw shortfall
+        orders = np.zeros((len(rows), len(graph.recipe_names)), dtype=np.int64)
+        orders[np.arange(len(rows)), recipes[rows]] = crafts * graph.output_amounts[recipes[rows]]
+        result = graph.net(inventory, None, orders, selection)
+        return result.total_shortfall() == 0
+
+    low = np.zeros(len(recipes), dtype=np.int64)  # always feasible
+    high = np.ones(len(recipes), dtype=np.int64)  # infeasible once the search settles
+    passes = 0
+
+    # Exponential search for an infeasible upper bound
+    growing = np.arange(len(recipes))
+    while len(growing):
+        ok = feasible(growing, high[growing])
+        passes += 1
+        low[growing[ok]] = high[growing[ok]]
+        high[growing[ok]] *= 2
+        growing = growing[ok & (high[growing] <= MAX_CRAFTS_SEARCHED)]
+
+    # Bisection between the last feasible and the first infeasible number of crafts
+    searching = np.flatnonzero((high - low > 1) & (low < MAX_CRAFTS_SEARCHED))
+    while len(searching):
+        middle = (low[searching] + high[searching]) // 2
+        ok = feasible(searching, middle)
+        passes += 1
+        low[searching[ok]] = middle[ok]
+        high[searching[~ok]] = middle[~ok]
+        searching = searching[high[searching] - low[searching] > 1]
+
+    capped = int(np.count_nonzero(low >= MAX_CRAFTS_SEARCHED))
+    if capped:
+        logging.warning(f"{capped} recipes reached the search limit of {MAX_CRAFTS_SEARCHED} crafts")
+
+    quantities = low * graph.output_amounts[recipes]
+    table = sorted(
+        ((graph.recipe_names[r], int(quantity)) for r, quantity in zip(recipes, quantities)),
+        key=lambda row: (-row[1], row[0])
+    )
+    logging.info(f"Computed max craftable quantities for {len(table)} recipes in {passes} batched passes")
+    return table
@@ -0,0 +1,128 @@
+import logging
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+MB = 1024 * 1024
+
+# Finished phases of the current run, in the order they ended
+_phases = []
+# Phases that are still running, innermost last
+_open_phases = []
+
+
+def parse_memory_budgets(text, phases=None):
+    # "load_catalog=200, schedule=100" -> {'load_catalog': 200.0, 'schedule': 100.0}; when the phases
+    # that are measured are given, budgets for any other name are ignored since they can never be checked
+    budgets = {}
+    for entry in text.split(','):
+        if not entry.strip():
+            continue
+        name, _, megabytes = entry.partition('=')
+        name = name.strip()
+        if phases is not None and name not in phases:
+            logging.warning(f"Ignoring memory budget '{entry.strip()}', unknown phase '{name}' (phases: {', '.join(phases)})")
+            continue
+        try:
+            budgets[name] = float(megabytes)
+        except ValueError:
+            logging.warning(f"Ignoring memory budget '{entry.strip()}', expected <phase>=<MB>")
+    return budgets
+
+
+def _rss_mb():
+    # Resident set size of this process, from /proc where available
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / MB
+    except (OSError, ValueError, IndexError):
+        return _max_rss_mb()
+
+
+def _max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / MB if sys.platform == 'darwin' else max_rss / 1024
+
+
+def reset():
+    # Forget the phases of the previous run, e.g. between profiles handled by the same worker
+    _phases.clear()
+
+
+@contextmanager
+def phase(name, enabled=False):
+    """
+    Measure the memory used by the code in the block when enabled. Records the
+    peak of Python allocations above the level at the start of the phase (tracemalloc), the RSS
+    at the end and the process' peak RSS. Phases can be nested.
+    """
+    if not enabled:
+        yield
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    current, peak = tracemalloc.get_traced_memory()
+    if _open_phases:
+        # Keep the enclosing phase's peak before it is reset for this one
+        _open_phases[-1]['peak'] = max(_open_phases[-1]['peak'], peak)
+    tracemalloc.reset_peak()
+    entry = {'name': name, 'start': current, 'peak': current, 'started_at': time.perf_counter()}
+    _open_phases.append(entry)
+    try:
+        yield
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        _open_phases.pop()
+        peak = max(entry['peak'], peak)
+        if _open_phases:
+            _open_phases[-1]['peak'] = max(_open_phases[-1]['peak'], peak)
+        _phases.append({
+            'phase': name,
+            'peak_mb': round((peak - entry['start']) / MB, 2),
+            'retained_mb': round((current - entry['start']) / MB, 2),
+            'rss_mb': round(_rss_mb(), 1),
+            'max_rss_mb': round(_max_rss_mb(), 1),
+            'seconds': round(time.perf_counter() - entry['started_at'], 3)
+        })
+        tracemalloc.reset_peak()
+
+
+def memory_summary():
+    # One record per finished phase; a phase that ran more than once keeps its largest peak
+    summary = {}
+    for record in _phases:
+        previous = summary.get(record['phase'])
+        if previous is None or record['peak_mb'] > previous['peak_mb']:
+            summary[record['phase']] = record
+    return list(summary.values())
+
+
+def check_memory_budgets(budgets, summary=None):
+    # Phases whose peak went over their budget (phase -> MB), as a list of (phase, peak MB, budget MB)
+    summary = memory_summary() if summary is None else summary
+    return [
+        (record['phase'], record['peak_mb'], budgets[record['phase']])
+        for record in summary
+        if record['phase'] in budgets and record['peak_mb'] > budgets[record['phase']]
+    ]
+
+
+def log_memory_summary(budgets):
+    # Logs the phases of the run and returns those over budget, see check_memory_budgets
+    summary = memory_summary()
+    if not summary:
+        return []
+    for record in summary:
+        logging.info(
+            f"Memory {record['phase']}: peak {record['peak_mb']} MB, retained {record['retained_mb']} MB, "
+            f"RSS {record['rss_mb']} MB (max {record['max_rss_mb']} MB), {record['seconds']}s"
+        )
+    exceeded = check_memory_budgets(budgets, summary)
+    for name, peak_mb, budget_mb in exceeded:
+        logging.warning(f"Memory budget exceeded in {name}: peak {peak_mb} MB, budget {budget_mb} MB")
+    return exceeded
@@ -0,0 +1,205 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# name -> (type, help); every metric the scripts record is declared here
+METRICS = {
+    'planner_sheets_requests_total': ('counter', "Worksheet reads and writes by backend and operation"),
+    'planner_sheets_request_errors_total': ('counter', "Worksheet reads and writes that raised an error"),
+    'planner_sheets_request_seconds': ('histogram', "Latency of worksheet reads and writes"),
+    'planner_rpc_requests_total': ('counter', "Solana RPC calls by method"),
+    'planner_rpc_request_errors_total': ('counter', "Solana RPC calls that failed"),
+    'planner_rpc_request_seconds': ('histogram', "Latency of Solana RPC calls"),
+    'planner_cache_lookups_total': ('counter', "SimpleCache lookups by result (hit or miss)"),
+    'planner_runs_total': ('counter', "Crafting plan runs by status"),
+    'planner_phase_seconds': ('histogram', "Duration of the crafting plan phases"),
+    'planner_memory_budget_exceeded_total': ('counter', "Crafting plan phases over their memory budget, by phase"),
+    'planner_catalog_builds_total': ('counter', "Compiled catalog rebuilds"),
+    'planner_result_memo_lookups_total': ('counter', "Result memo lookups by result (published, hit or miss)"),
+    'planner_items_expanded_total': ('counter', "Requested items whose ingredients were expanded again"),
+    'planner_inventory_stream_changes_total': ('counter', "Token account changes received from the inventory subscription"),
+    'planner_inventory_stream_flushes_total': ('counter', "Debounced ACCOUNT_RESOURCES writes of the inventory subscription"),
+    'planner_inventory_stream_reconnects_total': ('counter', "Inventory subscription disconnects"),
+    'planner_service_requests_total': ('counter', "Planning service requests by endpoint and HTTP status"),
+    'planner_service_request_seconds': ('histogram', "Latency of planning service requests"),
+    'planner_service_cache_lookups_total': ('counter', "Planning service response cache lookups by result (hit or miss)"),
+    'planner_run_triggers_total': ('counter', "Script runs by job and result (run or queued behind a run in flight)"),
+    'planner_run_lock_takeovers_total': ('counter', "Run locks taken over from a run that died"),
+    'planner_inventory_items': ('gauge', "Distinct items in the inventory of the last run"),
+    'planner_request_items': ('gauge', "Distinct requested items of the last run"),
+    'planner_last_run_timestamp_seconds': ('gauge', "Unix time the last crafting plan run finished"),
+}
+
+_lock = threading.Lock()
+# (name, sorted label items) -> value; histograms hold [bucket counts..., sum, count]
+_values = {}
+
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise KeyError(f"Unknown metric {name}, declare it in METRICS")
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _values.setdefault(key, [0] * (len(LATENCY_BUCKETS) + 2))
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+@contextmanager
+def timed(name, **labels):
+    # Observe the duration of the block in a histogram, also when it raises
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+@contextmanager
+def timed_request(service, **labels):
+    # Count and time one request to an external service ('sheets' or 'rpc'), and count it as an error if it raises
+    inc(f"planner_{service}_requests_total", **labels)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc(f"planner_{service}_request_errors_total", **labels)
+        raise
+    finally:
+        observe(f"planner_{service}_request_seconds", time.perf_counter() - started, **labels)
+
+
+def snapshot():
+    with _lock:
+        return {key: list(value) if isinstance(value, list) else value for key, value in _values.items()}
+
+
+def drain():
+    # Values recorded since the last call, e.g. for a worker process to hand to its parent
+    with _lock:
+        values = dict(_values)
+        _values.clear()
+    return values
+
+
+def merge(values):
+    # Add the values of another process; gauges take the merged value
+    with _lock:
+        for key, value in values.items():
+            kind = METRICS[key[0]][0]
+            if kind == 'histogram':
+                histogram = _values.setdefault(key, [0] * len(value))
+                for index, count in enumerate(value):
+                    histogram[index] += count
+            elif kind == 'counter':
+                _values[key] = _values.get(key, 0) + value
+            else:
+                _values[key] = value
+
+
+def _format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ''
+    escaped = [(label, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for label, value in labels]
+    return '{' + ','.join(f'{label}="{value}"' for label, value in escaped) + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    # All recorded metrics in the Prometheus text exposition format
+    values = snapshot()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind != 'histogram':
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+                continue
+            # Bucket counts are kept cumulative, as the exposition format expects
+            for bound, count in zip(LATENCY_BUCKETS, value):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', str(bound))])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {value[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(value[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(file_path):
+    # Prometheus text file, e.g. for node_exporter's textfile collector; written atomically so a
+    # collector never reads half a file. Nothing is written when file_path is empty.
+    if not file_path:
+        return
+    try:
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(render())
+        os.replace(temp_path, file_path)
+    except OSError as e:
+        logging.warning(f"Failed to write metrics to {file_path}: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes would otherwise flood debug.log
+        pass
+
+
+_server = None
+
+
+def start_http_server(port, host='127.0.0.1'):
+    """
+    Serve the metrics at http://host:port/metrics from a daemon thread, for processes that run long
+    enough to be scraped. Does nothing when the port is 0 or the server is already running.
+    """
+    global _server
+    if not port or _server is not None:
+        return _server
+    _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, name='metrics-http', daemon=True).start()
+    logging.info(f"Serving metrics on http://{host}:{_server.server_address[1]}/metrics")
+    return _server
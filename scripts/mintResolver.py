@@ -0,0 +1,148 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+import requests
+import metrics
+
+TOKEN_METADATA_PROGRAM_ID = 'metaqbxxUerdq28cj1RbAWkYQm3ybzjb6a8bt518x1s'
+# getMultipleAccounts accepts at most 100 accounts per call
+MAX_ACCOUNTS_PER_CALL = 100
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+
+def base58_decode(text):
+    number = 0
+    for character in text:
+        number = number * 58 + BASE58_ALPHABET.index(character)
+    leading_zeros = len(text) - len(text.lstrip('1'))
+    return b'\x00' * leading_zeros + number.to_bytes((number.bit_length() + 7) // 8, 'big')
+
+
+def base58_encode(data):
+    number = int.from_bytes(data, 'big')
+    text = ''
+    while number:
+        number, remainder = divmod(number, 58)
+        text = BASE58_ALPHABET[remainder] + text
+    leading_zeros = len(data) - len(data.lstrip(b'\x00'))
+    return '1' * leading_zeros + text
+
+
+# ed25519 field, used to check that a program derived address is not a valid public key
+ED25519_P = 2 ** 255 - 19
+ED25519_D = -121665 * pow(121666, ED25519_P - 2, ED25519_P) % ED25519_P
+
+
+def is_on_ed25519_curve(public_key):
+    # A compressed point decodes when (y^2 - 1) / (d y^2 + 1) is a square mod p
+    y = int.from_bytes(public_key, 'little') & ((1 << 255) - 1)
+    y_squared = y * y % ED25519_P
+    u = (y_squared - 1) % ED25519_P
+    v = (ED25519_D * y_squared + 1) % ED25519_P
+    if v == 0:
+        return u == 0
+    x_squared = u * pow(v, ED25519_P - 2, ED25519_P) % ED25519_P
+    return x_squared == 0 or pow(x_squared, (ED25519_P - 1) // 2, ED25519_P) == 1
+
+
+def find_program_address(seeds, program_id):
+    program_id_bytes = base58_decode(program_id)
+    for bump in range(255, -1, -1):
+        candidate = hashlib.sha256(b''.join(seeds) + bytes([bump]) + program_id_bytes + b'ProgramDerivedAddress').digest()
+        if not is_on_ed25519_curve(candidate):
+            return base58_encode(candidate)
+    raise ValueError("Unable to find a program derived address")
+
+
+def metadata_address(mint):
+    # Metaplex token metadata account of a mint
+    program_id_bytes = base58_decode(TOKEN_METADATA_PROGRAM_ID)
+    return find_program_address([b'metadata', program_id_bytes, base58_decode(mint)], TOKEN_METADATA_PROGRAM_ID)
+
+
+def parse_metadata_name(data):
+    # key (1), update authority (32), mint (32), then the name as a length prefixed, null padded string
+    offset = 1 + 32 + 32
+    (length,) = struct.unpack_from('<I', data, offset)
+    name = data[offset + 4:offset + 4 + length].decode('utf-8', errors='ignore')
+    return name.replace('\x00', '').strip() or None
+
+
+def fetch_metadata_names(rpc_url, mints):
+    """
+    Names from the token metadata accounts of the given mints, resolved with one getMultipleAccounts
+    call per 100 mints. Returns {mint: name}, None for mints without metadata.
+    """
+    names = {}
+    for start in range(0, len(mints), MAX_ACCOUNTS_PER_CALL):
+        batch = mints[start:start + MAX_ACCOUNTS_PER_CALL]
+        payload = {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "getMultipleAccounts",
+            "params": [[metadata_address(mint) for mint in batch], {"encoding": "base64"}]
+        }
+        with metrics.timed_request('rpc', method='getMultipleAccounts'):
+            response = requests.post(rpc_url, headers={'Content-Type': 'application/json'}, json=payload)
+            accounts = response.json()['result']['value']
+        for mint, account in zip(batch, accounts):
+            try:
+                names[mint] = parse_metadata_name(base64.b64decode(account['data'][0])) if account else None
+            except (struct.error, IndexError, KeyError, TypeError, ValueError) as e:
+                logging.warning(f"Failed to parse token metadata of {mint}: {e}")
+                names[mint] = None
+    return names
+
+
+def load_mint_name_cache(cache_file):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable mint name cache {cache_file}: {e}")
+        return {}
+
+
+def save_mint_name_cache(cache_file, cache):
+    temp_path = f"{cache_file}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(cache, file, indent=1, sort_keys=True)
+    os.replace(temp_path, cache_file)
+
+
+def resolve_mint_names(rpc_url, mints, cache_file, miss_ttl=86400):
+    """
+    Names of mints missing from the NFT data. Each mint is looked up on chain once and kept in
+    cache_file; mints without metadata are retried after miss_ttl seconds.
+    Returns {mint: name} for the mints that have a name.
+    """
+    cache = load_mint_name_cache(cache_file) if cache_file else {}
+    now = time.time()
+    missing = sorted(
+        mint for mint in set(mints)
+        if mint not in cache or (cache[mint]['name'] is None and now - cache[mint]['resolved_at'] > miss_ttl)
+    )
+
+    if missing:
+        try:
+            fetched = fetch_metadata_names(rpc_url, missing)
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Failed to resolve {len(missing)} unknown mints: {e}")
+            fetched = {}
+        for mint, name in fetched.items():
+            cache[mint] = {'name': name, 'resolved_at': now}
+        logging.info(f"Resolved {sum(1 for name in fetched.values() if name)} of {len(missing)} unknown mints on chain")
+        if cache_file and fetched:
+            try:
+                save_mint_name_cache(cache_file, cache)
+            except OSError as e:
+                logging.warning(f"Failed to write mint name cache {cache_file}: {e}")
+
+    return {mint: cache[mint]['name'] for mint in mints if mint in cache and cache[mint]['name']}
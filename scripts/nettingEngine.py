@@ -0,0 +1,201 @@
+import logging
+import weakref
+import numpy as np
+
+
+# Result of netting S scenarios at once. Arrays are indexed [scenario, mint] or [scenario, recipe]
+# using the index order of the NettingGraph that produced them.
+class NettingResult:
+    def __init__(self, gross, net, crafts, shortfall):
+        self.gross = gross  # total requirement per mint, including intermediate demand
+        self.net = net  # requirement left after using inventory
+        self.crafts = crafts  # number of crafts per recipe
+        self.shortfall = shortfall  # net requirement of raw (uncraftable) mints
+
+    def total_shortfall(self):
+        return self.shortfall.sum(axis=1)
+
+
+# Index-based view of the compiled catalog's recipe graph used to net many scenarios in one pass.
+class NettingGraph:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.mints = list(catalog.mint_order)
+        self.mint_index = {mint: index for index, mint in enumerate(self.mints)}
+        self.names = [catalog.mint_to_name.get(mint, mint) for mint in self.mints]
+
+        self.recipe_names = sorted(catalog.recipes)
+        self.recipe_index = {name: index for index, name in enumerate(self.recipe_names)}
+        self.output_amounts = np.array([catalog.recipes[name]['output_amount'] for name in self.recipe_names], dtype=np.int64)
+        self.recipe_outputs = [self.mint_index[catalog.recipes[name]['output_mint']] for name in self.recipe_names]
+        self.recipe_inputs = [
+            [(self.mint_index[mint], amount) for mint, amount in catalog.recipes[name]['inputs']]
+            for name in self.recipe_names
+        ]
+
+        self.producers = [
+            [self.recipe_index[name] for name in catalog.producers.get(mint, [])]
+            for mint in self.mints
+        ]
+        self.is_raw = np.array([not producers for producers in self.producers])
+
+        # Variant groups: mints with more than one producing recipe
+        self.group_mints = [index for index, producers in enumerate(self.producers) if len(producers) > 1]
+        self.group_of = {mint_index: group for group, mint_index in enumerate(self.group_mints)}
+        self.group_names = [self.names[mint_index] for mint_index in self.group_mints]
+        self.group_options = [[self.recipe_names[r] for r in self.producers[mint_index]] for mint_index in self.group_mints]
+
+        backward_edges = sum(
+            1 for r, inputs in enumerate(self.recipe_inputs)
+            for input_index, _ in inputs if input_index <= self.recipe_outputs[r]
+        )
+        if backward_edges:
+            logging.warning(f"Recipe graph contains {backward_edges} cyclic ingredient edges; their demand is ignored")
+
+    def mint_vector(self, quantities_by_name):
+        # Dense vector of quantities keyed by item name; names outside the recipe graph are ignored
+        vector = np.zeros(len(self.mints), dtype=np.int64)
+        for name, quantity in quantities_by_name.items():
+            index = self.mint_index.get(self.catalog.name_to_mint.get(name))
+            if index is not None:
+                vector[index] += int(quantity)
+        return vector
+
+    def order_vectors(self, requests):
+        """
+        Split requested items into orders for a specific recipe (e.g. 'Framework 1' or 'Steel') and
+        orders for a variant group output (e.g. 'Framework') whose recipe is chosen by the selection.
+        """
+        mint_orders = np.zeros(len(self.mints), dtype=np.int64)
+        recipe_orders = np.zeros(len(self.recipe_names), dtype=np.int64)
+        for item_name, quantity in requests.items():
+            if item_name in self.recipe_index:
+                recipe_orders[self.recipe_index[item_name]] += int(quantity)
+                continue
+            index = self.mint_index.get(self.catalog.name_to_mint.get(item_name))
+            if index is not None and self.producers[index]:
+                mint_orders[index] += int(quantity)
+            else:
+                logging.warning(f"No recipe found for requested item '{item_name}'.")
+        return mint_orders, recipe_orders
+
+    def default_selection(self, scenarios=1):
+        return np.zeros((scenarios, len(self.group_mints)), dtype=np.int64)
+
+    def reachable_groups(self, mint_orders, recipe_orders):
+        # Variant groups whose output can be required by the given orders under any selection
+        pending = [index for index in np.flatnonzero(mint_orders)]
+        for r in np.flatnonzero(recipe_orders):
+            pending.extend(input_index for input_index, _ in self.recipe_inputs[r])
+        seen = set(pending)
+        while pending:
+            index = pending.pop()
+            for r in self.producers[index]:
+                for input_index, _ in self.recipe_inputs[r]:
+                    if input_index not in seen:
+                        seen.add(input_index)
+                        pending.append(input_index)
+        return sorted(self.group_of[index] for index in seen if index in self.group_of)
+
+    def net(self, inventory, mint_orders=None, recipe_orders=None, selection=None):
+        """
+        Net S scenarios in one pass over the graph in topological order. Every argument is either a
+        single vector shared by all scenarios or a matrix with one row per scenario:
+        inventory and mint_orders are [mint] quantities, recipe_orders is [recipe] quantities to craft
+        with that exact recipe, and selection holds the chosen option index per variant group.
+        Ordered quantities are crafted regardless of inventory; their ingredients are netted against it.
+        """
+        mint_count, recipe_count = len(self.mints), len(self.recipe_names)
+        inventory = np.atleast_2d(np.asarray(inventory, dtype=np.int64))
+        mint_orders = np.atleast_2d(np.zeros(mint_count, dtype=np.int64) if mint_orders is None else np.asarray(mint_orders, dtype=np.int64))
+        recipe_orders = np.atleast_2d(np.zeros(recipe_count, dtype=np.int64) if recipe_orders is None else np.asarray(recipe_orders, dtype=np.int64))
+        selection = np.atleast_2d(self.default_selection() if selection is None else np.asarray(selection, dtype=np.int64))
+        scenarios = max(inventory.shape[0], mint_orders.shape[0], recipe_orders.shape[0], selection.shape[0])
+
+        inventory = np.broadcast_to(inventory, (scenarios, mint_count))
+        mint_orders = np.broadcast_to(mint_orders, (scenarios, mint_count))
+        recipe_orders = np.broadcast_to(recipe_orders, (scenarios, recipe_count))
+        selection = np.broadcast_to(selection, (scenarios, len(self.group_mints)))
+
+        gross = np.zeros((scenarios, mint_count), dtype=np.int64)
+        net = np.zeros((scenarios, mint_count), dtype=np.int64)
+        crafts = np.zeros((scenarios, recipe_count), dtype=np.int64)
+
+        for index in range(mint_count):
+            need = np.maximum(gross[:, index] - inventory[:, index], 0)
+            net[:, index] = need
+            producers = self.producers[index]
+            if not producers:
+                continue
+
+            need = need + mint_orders[:, index]
+            if len(producers) == 1:
+                routed = [(producers[0], need)]
+            else:
+                choice = selection[:, self.group_of[index]]
+                routed = [(r, np.where(choice == option, need, 0)) for option, r in enumerate(producers)]
+
+            for r, quantity in routed:
+                quantity = quantity + recipe_orders[:, r]
+                if not quantity.any():
+                    continue
+                recipe_crafts = -(-quantity // self.output_amounts[r])
+                crafts[:, r] += recipe_crafts
+                for input_index, amount in self.recipe_inputs[r]:
+                    gross[:, input_index] += recipe_crafts * amount
+
+        shortfall = np.where(self.is_raw, net, 0)
+        return NettingResult(gross, net, crafts, shortfall)
+
+    def shadow_prices(self, result, inventory, selection=None):
+        """
+        Marginal value of inventory for the plan netted into result: how much one more unit of each
+        mint reduces the total shortfall, per scenario ([scenario, mint] floats). One reverse pass
+        over the graph propagates the raw shortfall cost of a unit of every mint back through the
+        selected recipes; a mint only has a value while its gross requirement exceeds the inventory.
+        Crafts are treated as divisible, so the values are per-unit rates that hold until a mint is
+        no longer short or a batch boundary of a recipe with more than one output is crossed.
+        """
+        mint_count = len(self.mints)
+        gross = result.gross
+        scenarios = gross.shape[0]
+        inventory = np.broadcast_to(np.atleast_2d(np.asarray(inventory, dtype=np.int64)), (scenarios, mint_count))
+        selection = np.atleast_2d(self.default_selection() if selection is None else np.asarray(selection, dtype=np.int64))
+        selection = np.broadcast_to(selection, (scenarios, len(self.group_mints)))
+
+        short = gross > inventory
+        unit_cost = np.zeros((scenarios, mint_count), dtype=np.float64)
+        for index in reversed(range(mint_count)):
+            producers = self.producers[index]
+            if not producers:
+                unit_cost[:, index] = 1.0
+                continue
+
+            if len(producers) == 1:
+                routed = [(producers[0], None)]
+            else:
+                choice = selection[:, self.group_of[index]]
+                routed = [(r, choice == option) for option, r in enumerate(producers)]
+
+            for r, chosen in routed:
+                cost = np.zeros(scenarios, dtype=np.float64)
+                for input_index, amount in self.recipe_inputs[r]:
+                    # Cyclic edges are skipped, as in net
+                    if input_index > index:
+                        cost += amount * np.where(short[:, input_index], unit_cost[:, input_index], 0.0)
+                cost /= self.output_amounts[r]
+                unit_cost[:, index] += cost if chosen is None else np.where(chosen, cost, 0.0)
+
+        return np.where(short, unit_cost, 0.0)
+
+
+# Graphs of the catalogs in use. A graph is read-only once built, so runs on the same catalog share
+# it, and processes forked after it was built inherit it instead of building their own.
+_graphs = weakref.WeakKeyDictionary()
+
+
+def netting_graph(catalog):
+    graph = _graphs.get(catalog)
+    if graph is None:
+        graph = _graphs[catalog] = NettingGraph(catalog)
+    return graph
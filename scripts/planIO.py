@@ -0,0 +1,217 @@
+import csv
+import json
+import logging
+import os
+import re
+import metrics
+
+# Workbooks give the planner the same worksheet interface whether the data lives in the Google
+# spreadsheet or in local files: worksheet(title), and on each worksheet get(range),
+# get_all_values(), update(range, values), batch_clear(ranges) and clear(), as in gspread.
+WORKBOOK_FORMATS = ('sheets', 'csv', 'json', 'parquet')
+
+
+def parse_a1_range(data_range):
+    """
+    'A5:B50' -> (4, 0, 49, 1), zero based and inclusive. Missing rows or columns are open ended and
+    returned as None, e.g. 'A4:B' -> (3, 0, None, 1) and 'P1' -> (0, 15, 0, 15).
+    """
+    data_range = data_range.split('!')[-1].strip().upper()
+    start, _, end = data_range.partition(':')
+
+    def parse_cell(cell):
+        column, row = re.fullmatch(r'([A-Z]*)(\d*)', cell).groups()
+        column_index = None
+        if column:
+            column_index = 0
+            for letter in column:
+                column_index = column_index * 26 + ord(letter) - ord('A') + 1
+            column_index -= 1
+        return (int(row) - 1 if row else None), column_index
+
+    start_row, start_column = parse_cell(start)
+    if not end:
+        return start_row, start_column, start_row, start_column
+    end_row, end_column = parse_cell(end)
+    return start_row or 0, start_column or 0, end_row, end_column
+
+
+def _cell_text(value):
+    return '' if value is None else str(value)
+
+
+class LocalWorksheet:
+    def __init__(self, file_path, file_format, title):
+        self.file_path = file_path
+        self.file_format = file_format
+        self.title = title
+        self.rows = _read_grid(file_path, file_format) if os.path.exists(file_path) else []
+
+    def get(self, data_range):
+        start_row, start_column, end_row, end_column = parse_a1_range(data_range)
+        rows = self.rows[start_row:None if end_row is None else end_row + 1]
+        values = [[_cell_text(cell) for cell in row[start_column:None if end_column is None else end_column + 1]] for row in rows]
+        # Like the Sheets API, trailing empty cells and rows are left out
+        for row in values:
+            while row and row[-1] == '':
+                row.pop()
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def get_all_values(self):
+        return self.get('A1:ZZZ')
+
+    @property
+    def row_count(self):
+        # Rows in the grid, like gspread's Worksheet.row_count
+        return len(self.rows)
+
+    def update(self, range_name, values):
+        start_row, start_column, _, _ = parse_a1_range(range_name)
+        for row_offset, row_values in enumerate(values):
+            row = self._row(start_row + row_offset)
+            for column_offset, value in enumerate(row_values):
+                column = start_column + column_offset
+                row.extend([''] * (column + 1 - len(row)))
+                row[column] = _cell_text(value)
+        self._save()
+
+    def batch_clear(self, ranges):
+        for data_range in ranges:
+            start_row, start_column, end_row, end_column = parse_a1_range(data_range)
+            for row in self.rows[start_row:None if end_row is None else end_row + 1]:
+                stop = len(row) if end_column is None else min(end_column + 1, len(row))
+                row[start_column:stop] = [''] * max(stop - start_column, 0)
+        self._save()
+
+    def clear(self):
+        self.rows = []
+        self._save()
+
+    def _row(self, index):
+        while len(self.rows) <= index:
+            self.rows.append([])
+        return self.rows[index]
+
+    def _save(self):
+        temp_path = f"{self.file_path}.tmp"
+        _write_grid(temp_path, self.file_format, self.rows)
+        os.replace(temp_path, self.file_path)
+
+
+def _read_grid(file_path, file_format):
+    if file_format == 'csv':
+        with open(file_path, 'r', encoding='utf-8', newline='') as file:
+            return [row for row in csv.reader(file)]
+    if file_format == 'json':
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return [[_cell_text(cell) for cell in row] for row in json.load(file)]
+    # Parquet sheets store one string column per sheet column, named by its letter
+    import pyarrow.parquet as pq
+    columns = pq.read_table(file_path).to_pydict()
+    column_values = list(columns.values())
+    row_count = len(column_values[0]) if column_values else 0
+    return [[_cell_text(values[row]) for values in column_values] for row in range(row_count)]
+
+
+def _write_grid(file_path, file_format, rows):
+    if file_format == 'csv':
+        with open(file_path, 'w', encoding='utf-8', newline='') as file:
+            csv.writer(file).writerows(rows)
+    elif file_format == 'json':
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump(rows, file)
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        column_count = max((len(row) for row in rows), default=0)
+        columns = {}
+        for column in range(column_count):
+            letters, number = '', column + 1
+            while number:
+                number, remainder = divmod(number - 1, 26)
+                letters = chr(ord('A') + remainder) + letters
+            columns[letters] = pa.array([row[column] if column < len(row) else '' for row in rows], type=pa.string())
+        pq.write_table(pa.table(columns), file_path)
+
+
+# Worksheet methods that read or write cells, as recorded in the Sheets request metrics
+WORKSHEET_OPERATIONS = {
+    'get': 'read', 'get_all_values': 'read', 'batch_get': 'read', 'acell': 'read',
+    'update': 'write', 'batch_update': 'write', 'batch_clear': 'write', 'clear': 'write', 'update_cell': 'write'
+}
+
+
+# Passes everything through to the worksheet, timing its reads and writes
+class MeasuredWorksheet:
+    def __init__(self, worksheet, backend):
+        self.worksheet = worksheet
+        self.backend = backend
+
+    def __getattr__(self, name):
+        attribute = getattr(self.worksheet, name)
+        operation = WORKSHEET_OPERATIONS.get(name)
+        if operation is None or not callable(attribute):
+            return attribute
+
+        def measured(*args, **kwargs):
+            with metrics.timed_request('sheets', backend=self.backend, operation=operation):
+                return attribute(*args, **kwargs)
+        return measured
+
+
+# Sheets stored as one file per worksheet in a directory, e.g. ../data/planInputs/DASHBOARD.csv
+class LocalWorkbook:
+    def __init__(self, directory, file_format, create=False):
+        self.directory = directory
+        self.file_format = file_format
+        self.create = create
+        self.key = f"{file_format}:{os.path.abspath(directory)}"
+        self.worksheets = {}
+        if file_format == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as e:
+                raise ImportError(f"Parquet workbooks need pyarrow, install it with 'pip install pyarrow': {e}") from e
+        if create:
+            os.makedirs(directory, exist_ok=True)
+
+    def worksheet(self, title):
+        if title not in self.worksheets:
+            file_path = os.path.join(self.directory, f"{title}.{self.file_format}")
+            if not self.create and not os.path.exists(file_path):
+                raise FileNotFoundError(f"No {self.file_format} file for worksheet {title} at {file_path}")
+            self.worksheets[title] = MeasuredWorksheet(LocalWorksheet(file_path, self.file_format, title), self.file_format)
+        return self.worksheets[title]
+
+
+# The Google spreadsheet, opened once and shared by every worksheet lookup
+class SheetsWorkbook:
+    def __init__(self, client, spreadsheet_id):
+        self.client = client
+        self.key = spreadsheet_id
+        self.spreadsheet = None
+
+    def worksheet(self, title):
+        if self.spreadsheet is None:
+            with metrics.timed_request('sheets', backend='sheets', operation='open'):
+                self.spreadsheet = self.client.open_by_key(self.key)
+        # gspread fetches the spreadsheet metadata on every lookup
+        with metrics.timed_request('sheets', backend='sheets', operation='metadata'):
+            worksheet = self.spreadsheet.worksheet(title)
+        return MeasuredWorksheet(worksheet, 'sheets')
+
+
+def open_workbook(file_format, client, path, create=False, spreadsheet_id=None):
+    """
+    Workbook to read planner inputs from or write results to. file_format is one of WORKBOOK_FORMATS;
+    sheets uses the spreadsheet spreadsheet_id, the others a directory of
+    files at path. create allows local worksheets that do not exist yet, for writing.
+    """
+    if file_format == 'sheets':
+        return SheetsWorkbook(client, spreadsheet_id)
+    if file_format in WORKBOOK_FORMATS:
+        logging.info(f"Using local {file_format} worksheets in {path}")
+        return LocalWorkbook(path, file_format, create)
+    raise ValueError(f"Unknown workbook format '{file_format}', expected one of {', '.join(WORKBOOK_FORMATS)}")
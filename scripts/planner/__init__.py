@@ -0,0 +1,9 @@
+"""
+Crafting planner library. Importing it has no side effects: settings come from an explicit
+PlannerConfig, and the Sheets client and catalog are created by a Planner when first needed.
+
+    from planner import Planner, PlannerConfig
+    status = Planner(PlannerConfig.from_env()).run()
+"""
+from planner.config import PlannerConfig
+from planner.core import Planner, PlannerError, per_spreadsheet_path
@@ -0,0 +1,61 @@
+import time
+from collections import defaultdict
+import metrics
+
+
+# A simple in-memory cache to store data with expiration time.
+class SimpleCache:
+    def __init__(self):
+        self._cache = defaultdict(dict)
+
+    def set(self, key, value, ttl):
+        self._cache[key] = {
+            'value': value,
+            'expire_at': time.time() + ttl
+        }
+
+    def get(self, key):
+        entry = self._cache.get(key)
+        if not entry:
+            metrics.inc('planner_cache_lookups_total', result='miss')
+            return None
+        if time.time() > entry['expire_at']:
+            del self._cache[key]
+            metrics.inc('planner_cache_lookups_total', result='miss')
+            return None
+        metrics.inc('planner_cache_lookups_total', result='hit')
+        return entry['value']
+
+    def contents(self):
+        return self._cache
+
+    def get_permanent(self, key):
+        return self._cache.get(key, {}).get('value')
+
+    def set_permanent_with_refresh(self, key, value, refresh_interval=None):
+        self._cache[key] = {
+            'value': value,
+            'last_update': time.time(),
+            'refresh_interval': refresh_interval
+        }
+
+    def get_with_optional_refresh(self, key):
+        entry = self._cache.get(key)
+        if not entry:
+            metrics.inc('planner_cache_lookups_total', result='miss')
+            return None
+        if (entry.get('refresh_interval') is not None and
+                (time.time() - entry['last_update'] > entry['refresh_interval'])):
+            # The data is considered stale and needs to be refreshed
+            metrics.inc('planner_cache_lookups_total', result='miss')
+            return None
+        metrics.inc('planner_cache_lookups_total', result='hit')
+        return entry['value']
+
+    def invalidate(self, key):
+        if key in self._cache:
+            del self._cache[key]
+
+    def refresh(self, key):
+        if key in self._cache:
+            self._cache[key]['last_update'] = 0  # Force refresh on next get_with_optional_refresh call
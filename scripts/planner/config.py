@@ -0,0 +1,180 @@
+import os
+
+# Recipe files and planner state live here unless their settings point elsewhere
+DEFAULT_DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data'))
+
+
+def _flag(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+# attribute -> (environment variable, default, parser). Every setting of a planner run is declared here.
+SETTINGS = {
+    'spreadsheet_id': ('SPREADSHEET_ID', None, str),
+    'google_credentials_file': ('GOOGLE_CREDENTIALS_FILE', None, str),
+    'google_token_cache_file': ('GOOGLE_TOKEN_CACHE_FILE', None, str),  # Empty to request a new token every run
+    'google_token_refresh_margin': ('GOOGLE_TOKEN_REFRESH_MARGIN', 300, int),  # Seconds before expiry a cached token is replaced
+    'google_http_pool_size': ('GOOGLE_HTTP_POOL_SIZE', 10, int),
+    'data_dir': ('PLANNER_DATA_DIR', DEFAULT_DATA_DIR, str),
+
+    # Sheet titles, ranges and PROFILE labels
+    'player_profile_sheet': ('PLAYER_PROFILE_SHEET', None, str),
+    'player_profile_range': ('PLAYER_PROFILE_RANGE', None, str),
+    'account_data_fetch_sheet': ('ACCOUNT_DATA_FETCH_SHEET', None, str),
+    'account_data_fetch_range': ('ACCOUNT_DATA_FETCH_RANGE', None, str),
+    'crafting_data_fetch_sheet': ('CRAFTING_DATA_FETCH_SHEET', None, str),
+    'crafting_data_fetch_range': ('CRAFTING_DATA_FETCH_RANGE', None, str),
+    # Rows read per call from an open-ended request range such as A5:B, 0 to read it in one call
+    'crafting_request_page_rows': ('CRAFTING_REQUEST_PAGE_ROWS', 5000, int),
+    'crafting_results_sheet': ('CRAFTING_RESULTS_SHEET', None, str),
+    'crystal_lookup_key': ('CRYSTAL_LOOKUP_KEY', None, str),
+    'faction_lookup_key': ('FACTION_LOOKUP_KEY', None, str),
+    'framework_lookup_key': ('FRAMEWORK_LOOKUP_KEY', None, str),
+    'toolkit_lookup_key': ('TOOLKIT_LOOKUP_KEY', None, str),
+    'cache_expiry': ('CACHE_EXPIRY', 3600, int),  # 1 hour
+
+    # Wallet refresh (updateProfile.py, updateAll.py)
+    'node_rpc_host': ('NODE_RPC_HOST', None, str),
+    'wallet_lookup_key': ('WALLET_LOOKUP_KEY', None, str),  # PROFILE cell holding the wallet address
+    'mint_name_cache_file': ('MINT_NAME_CACHE_FILE', None, str),
+    'mint_name_miss_ttl': ('MINT_NAME_MISS_TTL', 86400, int),  # Seconds before mints without token metadata are looked up again
+    'inventory_history_db': ('INVENTORY_HISTORY_DB', None, str),  # Empty to keep no history
+
+    # Streamed wallet refresh (inventoryStream.py)
+    'node_ws_host': ('NODE_WS_HOST', '', str),  # Empty for NODE_RPC_HOST with ws:// or wss://
+    'inventory_stream_debounce': ('INVENTORY_STREAM_DEBOUNCE', 5.0, float),  # Seconds without changes before a write
+    'inventory_stream_max_delay': ('INVENTORY_STREAM_MAX_DELAY', 30.0, float),  # Longest a change waits while changes keep coming
+    'inventory_stream_resync_interval': ('INVENTORY_STREAM_RESYNC_INTERVAL', 3600.0, float),  # 0 to only resync on reconnect
+    'inventory_stream_ping_interval': ('INVENTORY_STREAM_PING_INTERVAL', 30.0, float),
+    'inventory_stream_max_backoff': ('INVENTORY_STREAM_MAX_BACKOFF', 60.0, float),
+
+    # Recipe files and state files; None means the file of that name in data_dir
+    'crafting_data_format': ('CRAFTING_DATA_FORMAT', None, str),
+    'crafting_data_raw': ('CRAFTING_DATA_RAW', None, str),
+    'crafting_data_source': ('CRAFTING_DATA_SOURCE', 'format', str),  # format (craftingDataFormat.json) or raw (craftingDataRaw.json)
+    'galaxy_nfts_data': ('GALAXY_NFTS_DATA', None, str),
+    'compiled_catalog_file': ('COMPILED_CATALOG_FILE', None, str),
+    'plan_state_file': ('PLAN_STATE_FILE', None, str),  # One file per spreadsheet
+    'last_run_state_file': ('LAST_RUN_STATE_FILE', None, str),
+    'result_memo_file': ('RESULT_MEMO_FILE', None, str),  # One file per spreadsheet, like plan_state_file
+    'result_memo_size': ('RESULT_MEMO_SIZE', 8, int),  # Results of this many distinct inputs are kept, 0 to disable
+    'run_lock_file': ('RUN_LOCK_FILE', None, str),  # One file per spreadsheet, empty to let runs overlap
+    'run_lock_stale_seconds': ('RUN_LOCK_STALE_SECONDS', 1800, int),  # Seconds without a refresh by its run after which a lock is taken over
+
+    # Skipping unchanged runs
+    'change_detection_mode': ('CHANGE_DETECTION_MODE', None, str),  # drive, cell, local or off; drive when a workbook is the Google sheet, off otherwise
+    'change_detection_cell': ('CHANGE_DETECTION_CELL', None, str),
+    'change_detection_file': ('CHANGE_DETECTION_FILE', None, str),
+
+    # Optional result tables; an empty range skips the table, a sheet of None means the results sheet
+    'max_craftable_results_sheet': ('MAX_CRAFTABLE_RESULTS_SHEET', None, str),
+    'max_craftable_results_range': ('MAX_CRAFTABLE_RESULTS_RANGE', 'P1', str),
+    'crafting_schedule_sheet': ('CRAFTING_SCHEDULE_SHEET', None, str),
+    'crafting_schedule_range': ('CRAFTING_SCHEDULE_RANGE', 'S1', str),
+    'crafting_slots': ('CRAFTING_SLOTS', 1, int),
+    'craft_batch_size': ('CRAFT_BATCH_SIZE', 0, int),  # Maximum crafts per job, 0 for one job per recipe
+    'procurement_price_file': ('PROCUREMENT_PRICE_FILE', '', str),  # Empty to skip the procurement list
+    'procurement_results_sheet': ('PROCUREMENT_RESULTS_SHEET', None, str),
+    'procurement_results_range': ('PROCUREMENT_RESULTS_RANGE', 'Z1', str),
+    'bottleneck_results_sheet': ('BOTTLENECK_RESULTS_SHEET', None, str),
+    'bottleneck_results_range': ('BOTTLENECK_RESULTS_RANGE', 'M1', str),
+
+    # Where inputs are read from and results written to
+    'plan_input_source': ('PLAN_INPUT_SOURCE', 'sheets', str),  # sheets, csv, json or parquet
+    'plan_input_path': ('PLAN_INPUT_PATH', None, str),
+    'plan_output_sink': ('PLAN_OUTPUT_SINK', 'sheets', str),  # sheets, csv, json or parquet
+    'plan_output_path': ('PLAN_OUTPUT_PATH', None, str),
+
+    # Batch entry points
+    'what_if_chunk_size': ('WHAT_IF_CHUNK_SIZE', 2048, int),  # Scenarios netted per batched pass of whatIf.py
+    'profile_spreadsheet_ids': ('PROFILE_SPREADSHEET_IDS', '', str),  # Comma separated, for runProfiles.py without ids
+    'process_pool_workers': ('PROCESS_POOL_WORKERS', 0, int),  # 0 for the number of CPU cores
+    'sheets_requests_per_minute': ('SHEETS_REQUESTS_PER_MINUTE', 60, int),  # Sheets API quota shared by all workers
+    'sheets_calls_per_profile': ('SHEETS_CALLS_PER_PROFILE', 20, int),  # Approximate calls of one profile run
+
+    # Planning service (planningService.py)
+    'planning_service_host': ('PLANNING_SERVICE_HOST', '127.0.0.1', str),
+    'planning_service_port': ('PLANNING_SERVICE_PORT', 8765, int),
+    'planning_service_workers': ('PLANNING_SERVICE_WORKERS', 0, int),  # 0 for the number of CPU cores
+    'planning_service_cache_size': ('PLANNING_SERVICE_CACHE_SIZE', 1024, int),  # Responses kept per distinct request body, 0 to disable
+    'planning_service_max_body': ('PLANNING_SERVICE_MAX_BODY', 1024 * 1024, int),
+
+    # Instrumentation
+    'memory_profile': ('MEMORY_PROFILE', False, _flag),
+    'memory_budgets': ('MEMORY_BUDGETS', '', str),  # e.g. "load_catalog=200,expand_requests=100"; phases are listed in planner/core.py PLAN_PHASES
+    'metrics_textfile': ('METRICS_TEXTFILE', '', str),
+    'metrics_port': ('METRICS_PORT', 0, int),  # 0 to disable
+    'metrics_host': ('METRICS_HOST', '127.0.0.1', str),
+}
+
+# Defaults of the file settings, relative to data_dir
+DATA_FILES = {
+    'crafting_data_format': 'craftingDataFormat.json',
+    'crafting_data_raw': 'craftingDataRaw.json',
+    'galaxy_nfts_data': 'galaxyNFTsData.json',
+    'compiled_catalog_file': 'compiledCatalog.pkl',
+    'plan_state_file': 'planState.json',
+    'last_run_state_file': 'lastRun.json',
+    'result_memo_file': 'resultMemo.json',
+    'run_lock_file': 'runLock.json',
+    'google_token_cache_file': 'googleToken.json',
+    'mint_name_cache_file': 'mintNameCache.json',
+    'inventory_history_db': 'inventoryHistory.sqlite',
+    'plan_input_path': 'planInputs',
+    'plan_output_path': 'planOutputs',
+}
+
+# Result tables that go to the results sheet unless they name their own
+RESULT_SHEETS = ('max_craftable_results_sheet', 'crafting_schedule_sheet', 'procurement_results_sheet', 'bottleneck_results_sheet')
+
+
+class PlannerConfig:
+    """
+    Settings of the crafting planner, one attribute per SETTINGS entry. Built from keyword arguments
+    or, with from_env, from environment variables; nothing is read from the environment otherwise.
+    """
+    def __init__(self, **settings):
+        unknown = set(settings) - set(SETTINGS)
+        if unknown:
+            raise TypeError(f"Unknown planner settings: {', '.join(sorted(unknown))}")
+        for name, (_, default, _) in SETTINGS.items():
+            setattr(self, name, settings.get(name, default))
+        for name, file_name in DATA_FILES.items():
+            if getattr(self, name) is None:
+                setattr(self, name, os.path.join(self.data_dir, file_name))
+        for name in RESULT_SHEETS:
+            if getattr(self, name) is None:
+                setattr(self, name, self.crafting_results_sheet)
+        if self.change_detection_mode is None:
+            # A run on local workbooks has no spreadsheet revision to check
+            self.change_detection_mode = 'drive' if 'sheets' in (self.plan_input_source, self.plan_output_sink) else 'off'
+
+    @classmethod
+    def from_env(cls, environ=None, **overrides):
+        # Settings from environ (os.environ by default); load .env into it first if you use one
+        environ = os.environ if environ is None else environ
+        settings = {}
+        for name, (variable, _, parse) in SETTINGS.items():
+            if environ.get(variable) is not None:
+                settings[name] = parse(environ[variable])
+        settings.update(overrides)
+        return cls(**settings)
+
+    def settings(self):
+        return {name: getattr(self, name) for name in SETTINGS}
+
+    def replace(self, **changes):
+        # Copy with some settings changed, e.g. config.replace(spreadsheet_id=...) per profile
+        return PlannerConfig(**{**self.settings(), **changes})
+
+    def crafting_data_file(self):
+        return self.crafting_data_raw if self.crafting_data_source == 'raw' else self.crafting_data_format
+
+    def procurement_enabled(self):
+        return bool(self.procurement_price_file and self.procurement_results_range)
+
+    def uses_google_sheets(self):
+        return 'sheets' in (self.plan_input_source, self.plan_output_sink) or self.change_detection_mode in ('drive', 'cell')
+
+    def __repr__(self):
+        return f"PlannerConfig({', '.join(f'{name}={value!r}' for name, value in self.settings().items())})"
@@ -0,0 +1,338 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+import metrics
+from bottlenecks import bottlenecks
+from changeDetection import make_revision_source, current_inputs_stamp, inputs_unchanged, record_successful_run
+from compiledCatalog import load_or_build_catalog
+from craftScheduler import schedule_crafts
+from incrementalPlan import IncrementalPlan
+from maxCraftable import max_craftable
+from memoryProfile import phase as memory_phase, reset as reset_memory_profile, log_memory_summary, parse_memory_budgets
+from nettingEngine import netting_graph
+from planIO import open_workbook
+from procurement import ProcurementGraph, load_price_table
+from resultMemo import ResultMemo, input_fingerprint
+from runLock import single_flight
+from variantOptimizer import choose_variants, selection_vector
+from planner.cache import SimpleCache
+from planner.config import PlannerConfig
+from planner.ingredients import compute_unit_contribution, consolidate_full_ingredients
+from planner.inputs import (
+    aggregate_crafting_requests, fetch_crafting_requests, fetch_user_preferences, find_player_crystal_choice,
+    find_player_faction, get_player_ingredient_quantities, player_variant_preferences
+)
+from planner.publish import publish_results
+from planner.sheets import get_worksheet
+
+
+# Phases a run measures, in the order they start; MEMORY_BUDGETS entries are checked against these
+PLAN_PHASES = (
+    'run', 'load_catalog', 'read_inputs', 'choose_variants', 'expand_requests', 'net_needed',
+    'max_craftable', 'schedule', 'shadow_prices', 'procurement'
+)
+
+
+class PlannerError(Exception):
+    pass
+
+
+def per_spreadsheet_path(file_path, spreadsheet_id):
+    # State files are kept per spreadsheet, e.g. planState.json -> planState.<spreadsheet id>.json
+    if not spreadsheet_id or not file_path:
+        return file_path
+    root, extension = os.path.splitext(file_path)
+    return f"{root}.{spreadsheet_id}{extension}"
+
+
+class Planner:
+    """
+    Crafting planner for one configuration. The Sheets client and the compiled catalog are created
+    on first use and kept, so a worker or service can plan many times without starting up again;
+    either can also be passed in to share it between planners. Caches belong to the instance.
+    """
+    def __init__(self, config=None, client=None, catalog=None):
+        self.config = config if config is not None else PlannerConfig()
+        self._client = client
+        self._catalog = catalog
+        self.cache = SimpleCache()
+        # Phases of the last run over their memory budget, as (phase, peak MB, budget MB)
+        self.memory_budgets_exceeded = []
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self.auth_gspread()
+        return self._client
+
+    @property
+    def catalog(self):
+        if self._catalog is None:
+            self._catalog = self.load_catalog()
+        return self._catalog
+
+    def auth_gspread(self):
+        # Imported here so runs on local files never load the Google libraries
+        from googleAuth import authorize
+        config = self.config
+        try:
+            # Reuses a cached access token and one keep-alive session, see googleAuth.py
+            client = authorize(config.google_credentials_file, config.google_token_cache_file,
+                               config.google_token_refresh_margin, config.google_http_pool_size)
+        except Exception as e:
+            raise PlannerError(f"Failed to authenticate with Google Sheets: {e}") from e
+        logging.info("Authenticated with Google Sheets successfully")
+        return client
+
+    def load_catalog(self, force_rebuild=False):
+        config = self.config
+        catalog = load_or_build_catalog(config.crafting_data_file(), config.galaxy_nfts_data, config.compiled_catalog_file,
+                                        compute_unit_contribution, force_rebuild, config.crafting_data_source)
+        if catalog is None:
+            raise PlannerError("Failed to load the crafting catalog")
+        self._catalog = catalog
+        return catalog
+
+    # Inputs and results can live in local files instead of the spreadsheet
+    def input_workbook(self, client):
+        config = self.config
+        return open_workbook(config.plan_input_source, client, config.plan_input_path, spreadsheet_id=config.spreadsheet_id)
+
+    def output_workbook(self, client):
+        config = self.config
+        return open_workbook(config.plan_output_sink, client, config.plan_output_path, create=True, spreadsheet_id=config.spreadsheet_id)
+
+    def player_preferences(self, source):
+        # (user preferences, crystal choice, faction) from the PROFILE tab
+        config = self.config
+        user_preferences = fetch_user_preferences(source, config.player_profile_sheet, config.framework_lookup_key, config.toolkit_lookup_key)
+        return user_preferences, find_player_crystal_choice(source, config, self.cache), find_player_faction(source, config, self.cache)
+
+    def player_ingredients(self, source):
+        return get_player_ingredient_quantities(source, self.config, self.cache)
+
+    def crafting_requests(self, source):
+        return fetch_crafting_requests(source, self.config, self.cache)
+
+    def run(self, client=None, catalog=None, player_ingredients=None):
+        """
+        Plan the crafting requests of the configured spreadsheet and publish the results.
+        player_ingredients can be passed in when the inventory was just fetched, so ACCOUNT_RESOURCES
+        is not read back from the sheet.
+        Returns 'unchanged' when the run was skipped, 'updated' when the results were published
+        and 'failed' when a worksheet could not be accessed.
+        With memory_profile or memory_budgets set, the memory used by each phase is logged at the end
+        of the run and the phases over budget are kept in memory_budgets_exceeded.
+        """
+        if client is None and self.config.uses_google_sheets():
+            client = self.client
+        reset_memory_profile()
+        with self.run_phase('run'):
+            status = self._plan(client, catalog, player_ingredients)
+        metrics.inc('planner_runs_total', status=status)
+        metrics.set_gauge('planner_last_run_timestamp_seconds', round(time.time(), 3))
+        self.memory_budgets_exceeded = log_memory_summary(parse_memory_budgets(self.config.memory_budgets, PLAN_PHASES))
+        for name, _, _ in self.memory_budgets_exceeded:
+            metrics.inc('planner_memory_budget_exceeded_total', phase=name)
+        return status
+
+    def single_flight(self, job, run):
+        """
+        Call run() under the run lock of the configured spreadsheet, so overlapping triggers of any job
+        collapse into at most one pending run behind the run in flight (see runLock.single_flight).
+        Returns the status of run() or 'queued'.
+        """
+        config = self.config
+        return single_flight(per_spreadsheet_path(config.run_lock_file, config.spreadsheet_id), job, run, config.run_lock_stale_seconds)
+
+    @contextmanager
+    def run_phase(self, name):
+        # Duration of every phase goes to the metrics, its memory use to the memory profile when enabled;
+        # budgets are only checked against measured phases, so setting them enables the profile too
+        profile_memory = self.config.memory_profile or bool(self.config.memory_budgets)
+        with memory_phase(name, profile_memory), metrics.timed('planner_phase_seconds', phase=name):
+            yield
+
+    def _plan(self, client, catalog, player_ingredients):
+        config = self.config
+        run_phase = self.run_phase
+
+        # Skip the run when neither the spreadsheet nor the recipe files changed since the last successful run
+        spreadsheet_id = config.spreadsheet_id
+        local_input_files = [config.crafting_data_file(), config.galaxy_nfts_data] + ([config.procurement_price_file] if config.procurement_enabled() else [])
+        revision_source = make_revision_source(config.change_detection_mode, client, spreadsheet_id, config.change_detection_cell, config.change_detection_file)
+        inputs_stamp = current_inputs_stamp(revision_source, local_input_files) if revision_source is not None else None
+        if inputs_unchanged(inputs_stamp, config.last_run_state_file, spreadsheet_id):
+            logging.info("Spreadsheet and recipe files unchanged since the last successful run, nothing to update")
+            return 'unchanged'
+
+        try:
+            source = self.input_workbook(client)
+            sink = self.output_workbook(client)
+        except (ValueError, ImportError) as e:
+            logging.error(f"Error opening plan inputs or outputs: {e}")
+            return 'failed'
+
+        # Load the compiled catalog, rebuilding it only when the recipe or NFT files changed
+        if catalog is None:
+            with run_phase('load_catalog'):
+                catalog = self.catalog
+        parsed_crafting_data = catalog.parsed_crafting_data
+        mint_to_name = catalog.mint_to_name
+        name_to_mint = catalog.name_to_mint
+        logging.info("Crafting data parsed successfully")
+
+        with run_phase('read_inputs'):
+            # Fetch player profile and account data
+            player_profile_worksheet = get_worksheet(source, config.player_profile_sheet)
+            # The account data sheet is only read when the inventory was not passed in
+            account_data_missing = player_ingredients is None and get_worksheet(source, config.account_data_fetch_sheet) is None
+
+            if player_profile_worksheet is None or account_data_missing:
+                logging.error("Error accessing worksheets")
+                return 'failed'
+
+            # Find player's framework and toolkit preferences, crystal choice and faction
+            user_preferences, player_crystal_choice, player_faction = self.player_preferences(source)
+            if player_ingredients is None:
+                player_ingredients = self.player_ingredients(source)
+            logging.info(f"Player's crystal choice: {player_crystal_choice}")
+
+            # Fetch crafting requests data
+            crafting_requests_worksheet = get_worksheet(source, config.crafting_data_fetch_sheet)
+            if crafting_requests_worksheet is None:
+                return 'failed'
+
+            crafting_requests = self.crafting_requests(source)
+            prices = None
+            if config.procurement_enabled():
+                try:
+                    prices = load_price_table(config.procurement_price_file, name_to_mint)
+                except (OSError, ValueError, TypeError, AttributeError) as e:
+                    logging.error(f"Error reading price table {config.procurement_price_file}: {e}")
+                    return 'failed'
+        metrics.set_gauge('planner_inventory_items', len(player_ingredients))
+        metrics.set_gauge('planner_request_items', len({item_name for item_name, _ in crafting_requests}))
+
+        # Runs with the same inputs and catalog have the same results: reuse them, and skip the writes when they are already published
+        fingerprint = input_fingerprint(self.plan_inputs(crafting_requests, player_ingredients, user_preferences, player_crystal_choice, player_faction, prices), catalog)
+        memo = ResultMemo(per_spreadsheet_path(config.result_memo_file, spreadsheet_id), config.result_memo_size)
+        if memo.is_published(fingerprint, sink.key):
+            logging.info("Planner inputs unchanged since the published results, nothing to update")
+            metrics.inc('planner_result_memo_lookups_total', result='published')
+            if revision_source is not None:
+                record_successful_run(config.last_run_state_file, spreadsheet_id, inputs_stamp)
+            return 'unchanged'
+        memoized_results = memo.get(fingerprint)
+        if memoized_results is not None:
+            logging.info("Reusing the results of an earlier run with the same planner inputs")
+            metrics.inc('planner_result_memo_lookups_total', result='hit')
+            if not publish_results(sink, memoized_results, mint_to_name, name_to_mint, config):
+                return 'failed'
+            memo.mark_published(fingerprint, sink.key)
+            memo.save()
+            if revision_source is not None:
+                record_successful_run(config.last_run_state_file, spreadsheet_id, inputs_stamp)
+            return 'updated'
+        metrics.inc('planner_result_memo_lookups_total', result='miss')
+
+        # Choose the variant recipes that leave the smallest total shortfall for the requests
+        with run_phase('choose_variants'):
+            graph = netting_graph(catalog)
+            pinned_variants, preferred_variants = player_variant_preferences(user_preferences, player_crystal_choice, player_faction)
+            variant_choices = choose_variants(graph, aggregate_crafting_requests(crafting_requests, {}), player_ingredients, pinned_variants, preferred_variants)
+        chosen_crystal_recipe = variant_choices.get('Crystal Lattice')
+        logging.info(f"Chosen Crystal Lattice Recipe: {chosen_crystal_recipe}")
+
+        # Only the items whose requested quantity changed since the last run are expanded again
+        requested_items = aggregate_crafting_requests(crafting_requests, variant_choices)
+        with run_phase('expand_requests'):
+            plan = IncrementalPlan(per_spreadsheet_path(config.plan_state_file, spreadsheet_id))
+            plan.load({'variants': variant_choices}, catalog)
+            plan.update_requests(
+                requested_items,
+                lambda item_name: (catalog.unit_bom(item_name, chosen_crystal_recipe)
+                                   or compute_unit_contribution(item_name, parsed_crafting_data, mint_to_name, chosen_crystal_recipe))
+            )
+        metrics.inc('planner_items_expanded_total', plan.expanded_items)
+        logging.info(f"Found {len(plan.requests)} requested items.")
+
+        # Initial, full and raw ingredient totals of the whole plan
+        all_raw_ingredients = plan.totals['raw']
+        all_full_ingredients = consolidate_full_ingredients(plan.totals['full'], all_raw_ingredients)
+
+        # Net the whole plan against the inventory in one pass with the chosen variants, the netting the
+        # variants were chosen by, so an intermediate shared by several requests draws on a single stock
+        with run_phase('net_needed'):
+            plan_result = graph.net(graph.mint_vector(player_ingredients), *graph.order_vectors(requested_items), selection_vector(graph, variant_choices))
+            needed_ingredients = {graph.names[index]: int(plan_result.net[0, index]) for index in np.flatnonzero(plan_result.net[0])}
+            # Add missing ingredients with amount 0
+            for ingredient in all_full_ingredients:
+                needed_ingredients.setdefault(ingredient, 0)
+        logging.info("Calculated needed ingredients")
+
+        results = {
+            'initial': plan.totals['initial'],
+            'raw': all_raw_ingredients,
+            'full': all_full_ingredients,
+            'needed': needed_ingredients,
+            'max_craftable': None,
+            'schedule': None,
+            'procurement': None,
+            'bottlenecks': None
+        }
+
+        # Rank everything the player can craft right now across the whole catalog
+        if config.max_craftable_results_range:
+            with run_phase('max_craftable'):
+                results['max_craftable'] = max_craftable(graph, player_ingredients, variant_choices)
+
+        # Schedule the crafts of the expanded plan on the available crafting slots
+        if config.crafting_schedule_range:
+            with run_phase('schedule'):
+                results['schedule'] = schedule_crafts(graph, plan_result.crafts[0], config.crafting_slots, config.craft_batch_size)
+
+        # Items whose extra units would reduce the total shortfall the most
+        if config.bottleneck_results_range:
+            with run_phase('shadow_prices'):
+                results['bottlenecks'] = bottlenecks(graph, player_ingredients, requested_items, variant_choices)
+
+        # Cheapest mix of buying and crafting for the requests, choosing variants by cost instead of shortfall
+        if prices is not None:
+            with run_phase('procurement'):
+                procurement = ProcurementGraph(graph, pinned_variants)
+                # Variant group requests such as 'Toolkit' are left to the cheapest recipe unless the player pinned one
+                procurement_orders = graph.order_vectors(aggregate_crafting_requests(crafting_requests, {}))
+                results['procurement'] = procurement.procure(prices, graph.mint_vector(player_ingredients), *procurement_orders)
+
+        results = memo.put(fingerprint, results)
+        if not publish_results(sink, results, mint_to_name, name_to_mint, config):
+            return 'failed'
+        plan.save()
+        memo.mark_published(fingerprint, sink.key)
+        memo.save()
+
+        if revision_source is not None:
+            record_successful_run(config.last_run_state_file, spreadsheet_id, inputs_stamp)
+        return 'updated'
+
+    def plan_inputs(self, crafting_requests, player_ingredients, user_preferences, player_crystal_choice, player_faction, prices=None):
+        # Everything the results depend on besides the catalog, for the result memo fingerprint
+        config = self.config
+        return {
+            'requests': aggregate_crafting_requests(crafting_requests, {}),
+            'inventory': player_ingredients,
+            'preferences': user_preferences,
+            'crystal': player_crystal_choice,
+            'faction': player_faction,
+            'prices': prices,
+            'settings': {
+                'results_sheet': config.crafting_results_sheet,
+                'max_craftable': [config.max_craftable_results_sheet, config.max_craftable_results_range],
+                'schedule': [config.crafting_schedule_sheet, config.crafting_schedule_range, config.crafting_slots, config.craft_batch_size],
+                'procurement': [config.procurement_results_sheet, config.procurement_results_range],
+                'bottlenecks': [config.bottleneck_results_sheet, config.bottleneck_results_range]
+            }
+        }
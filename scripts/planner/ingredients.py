@@ -0,0 +1,78 @@
+import logging
+
+
+def find_all_ingredients(item, parsed_data, mint_to_name, crystal_recipe, depth=0, max_depth=7, final_product_quantity=0, parent_quantity=1):
+    """
+    Recursively find all the ingredients required for an item.
+    This function returns a tuple: (all_ingredients, raw_ingredients)
+    """
+    if depth > max_depth:
+        return {}, []
+
+    item_key = str(item).strip().title()
+    if item_key == 'Crystal Lattice':
+        item_key = crystal_recipe
+
+    all_ingredients = {}
+    raw_ingredients = []
+
+    if item_key not in parsed_data or 'ingredients' not in parsed_data[item_key]:
+        raw_ingredients.append((item_key, parent_quantity))
+        return {item_key: parent_quantity}, raw_ingredients
+
+    for ingredient in parsed_data[item_key]['ingredients']:
+        ingredient_mint = ingredient['mint']
+        ingredient_name = mint_to_name.get(ingredient_mint, "Unknown Ingredient")
+        ingredient_quantity = int(ingredient['amount']) * parent_quantity
+
+        # Update all ingredients
+        all_ingredients[ingredient_name] = all_ingredients.get(ingredient_name, 0) + ingredient_quantity
+
+        # Recursively find ingredients for the sub-ingredient
+        sub_all_ingredients, sub_raw_ingredients = find_all_ingredients(
+            ingredient_name, parsed_data, mint_to_name, crystal_recipe, depth + 1, max_depth, parent_quantity=ingredient_quantity
+        )
+
+        # Update all ingredients with sub-ingredients
+        for name, qty in sub_all_ingredients.items():
+            all_ingredients[name] = all_ingredients.get(name, 0) + qty
+
+        # Update raw ingredients list
+        raw_ingredients.extend(sub_raw_ingredients)
+
+    # If we are at the initial call, and this item is the final product, subtract the requested quantity
+    if depth == 0 and final_product_quantity > 0:
+        all_ingredients[item_key] = all_ingredients.get(item_key, 0) + 1 - final_product_quantity
+
+    return all_ingredients, list(set(raw_ingredients))  # Convert to set and back to list to remove duplicates
+
+
+def compute_unit_contribution(item_name, parsed_crafting_data, mint_to_name, crystal_recipe):
+    """
+    Ingredient totals contributed by a single unit of a requested item.
+    Every total scales linearly with the requested quantity.
+    """
+    matched_recipe = parsed_crafting_data.get(item_name)
+    if not matched_recipe or not matched_recipe.get('ingredients'):
+        logging.warning(f"No matched recipe found for '{item_name}'.")
+        return {'initial': {}, 'raw': {}, 'full': {}}
+
+    initial_ingredients = {}
+    for ingredient in matched_recipe['ingredients']:
+        name = mint_to_name.get(ingredient['mint'], "Unknown Ingredient")
+        initial_ingredients[name] = initial_ingredients.get(name, 0) + int(ingredient['amount'])
+
+    full_ingredients, raw_ingredients_list = find_all_ingredients(item_name, parsed_crafting_data, mint_to_name, crystal_recipe)
+    raw_ingredients = {}
+    for raw_name, raw_qty in raw_ingredients_list:
+        raw_ingredients[raw_name] = raw_ingredients.get(raw_name, 0) + raw_qty
+
+    logging.info(f"Expanded ingredients for '{item_name}'.")
+    return {'initial': initial_ingredients, 'raw': raw_ingredients, 'full': full_ingredients}
+
+
+def consolidate_full_ingredients(all_full_ingredients, all_raw_ingredients):
+    # Raw ingredients are listed with their raw totals rather than their expanded totals
+    consolidated = {name: qty for name, qty in all_full_ingredients.items() if name not in all_raw_ingredients}
+    consolidated.update(all_raw_ingredients)
+    return consolidated
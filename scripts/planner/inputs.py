@@ -0,0 +1,252 @@
+import logging
+from decimal import Decimal, InvalidOperation
+from planIO import parse_a1_range
+from planner.sheets import column_letters, fetch_data_with_caching, get_worksheet
+
+MAX_LOGGED_REQUEST_ERRORS = 20  # Malformed rows logged one by one, the rest are only counted
+
+
+# PROFILE tab labels for the variant recipes, used to read the player's explicit preferences
+crystal_lattice_variants = {
+    'Diamond': 'Crystal Lattice 1',
+    'Rochinol': 'Crystal Lattice 2',
+    'Arco': 'Crystal Lattice 3'
+}
+
+framework_variants = {
+    'Framework 1 (Iron)': 'Framework 1',
+    'Framework 2 (Steel)': 'Framework 2'
+}
+
+toolkit_variants = {
+    'Toolkit 1 (Iron)': 'Toolkit 1',
+    'Toolkit 2 (Steel)': 'Toolkit 2'
+}
+
+# Crystal favoured by each faction, used to break ties between equally good variant choices
+faction_crystal_variants = {
+    'MUD': 'Diamond',
+    'ONI': 'Rochinol',
+    'USTUR': 'Arco'
+}
+
+
+def resolve_variant_preference(preference, aliases):
+    # Recipe name for a PROFILE preference such as 'Framework 2 (Steel)', 'Arco' or 'Toolkit 1', None for 'none'
+    if not preference or preference.strip().lower() == 'none':
+        return None
+    preference = preference.strip().title()
+    return aliases.get(preference, preference)
+
+
+def player_variant_preferences(user_preferences, player_crystal_choice, player_faction):
+    # Explicit choices from the PROFILE tab are pinned; the faction crystal only breaks ties
+    pinned = {
+        'Crystal Lattice': resolve_variant_preference(player_crystal_choice, crystal_lattice_variants),
+        'Framework': resolve_variant_preference(user_preferences['framework'], framework_variants),
+        'Toolkit': resolve_variant_preference(user_preferences['toolkit'], toolkit_variants)
+    }
+    pinned = {group: recipe for group, recipe in pinned.items() if recipe}
+
+    preferred = {}
+    if player_faction in faction_crystal_variants:
+        preferred['Crystal Lattice'] = crystal_lattice_variants[faction_crystal_variants[player_faction]]
+    return pinned, preferred
+
+
+def fetch_user_preferences(workbook, sheet_title, framework_key, toolkit_key):
+    worksheet = get_worksheet(workbook, sheet_title)
+    data = worksheet.get_all_values()
+    preferences = {'framework': 'none', 'toolkit': 'none'}
+
+    for row in data:
+        if framework_key in row:
+            preferences['framework'] = row[row.index(framework_key) + 1].strip().title()
+        if toolkit_key in row:
+            preferences['toolkit'] = row[row.index(toolkit_key) + 1].strip().title()
+
+    return preferences
+
+
+def find_player_faction(workbook, config, cache):
+    data = fetch_data_with_caching(cache, workbook, config.player_profile_sheet, config.player_profile_range, ttl=config.cache_expiry)
+
+    # Search for the faction key in the cached data
+    faction_name = None
+    for row in data:
+        if config.faction_lookup_key in row:
+            faction_index = row.index(config.faction_lookup_key)
+            if faction_index + 1 < len(row):  # Check if next cell exists
+                faction_name = row[faction_index + 1]
+                break
+
+    if faction_name is None:
+        logging.error(f"Error finding player faction: {config.faction_lookup_key} not found in the data.")
+    else:
+        logging.info(f"Player faction found: {faction_name}")
+
+    return faction_name
+    
+
+def find_player_crystal_choice(workbook, config, cache):
+    # Fetch the data from cache or sheets
+    data = fetch_data_with_caching(cache, workbook, config.player_profile_sheet, config.player_profile_range, ttl=config.cache_expiry)
+
+    # Search for the crystal choice within the cached data
+    crystal_choice = None
+    for row in data:
+        # Create a case-insensitive search for the lookup key in each row
+        row_lower = [cell.lower() for cell in row]  # Convert each cell in the row to lowercase
+        if config.crystal_lookup_key.lower() in row_lower:
+            # Get the index of the lookup key and retrieve the adjacent value
+            crystal_choice = row[row_lower.index(config.crystal_lookup_key.lower()) + 1].strip().lower()
+            break
+
+    if crystal_choice is None:
+        logging.error(f"Error finding player crystal choice: {config.crystal_lookup_key} not found in the data.")
+    elif crystal_choice == 'none':
+        logging.info("Player has not specified a crystal choice (set to 'none').")
+    else:
+        logging.info(f"Player's crystal choice found: {crystal_choice}")
+
+    return crystal_choice
+
+
+
+def get_player_ingredient_quantities(workbook, config, cache):
+    # Fetch the data from cache or sheets
+    data = fetch_data_with_caching(cache, workbook, config.account_data_fetch_sheet, config.account_data_fetch_range, ttl=config.cache_expiry)
+    return parse_player_ingredient_rows(data)
+
+
+def parse_player_ingredient_rows(rows):
+    # Convert [name, quantity] rows into a dictionary of ingredients and quantities
+    player_ingredients = {}
+    for row in rows:
+        if len(row) >= 2 and row[0] and row[1]:
+            ingredient = str(row[0]).strip()
+            quantity = str(row[1]).strip().replace(',', '')  # Remove commas for conversion to int
+            try:
+                player_ingredients[ingredient] = int(quantity)
+            except ValueError:
+                logging.error(f"Invalid quantity for ingredient '{ingredient}': {quantity}")
+                continue
+
+    if not player_ingredients:
+        logging.info("No player ingredients found in the specified range.")
+    else:
+        # Log the fetched player ingredients
+        for ingredient, quantity in player_ingredients.items():
+            logging.info(f"{ingredient}: {quantity}")
+
+    return player_ingredients
+
+
+def account_resources_to_ingredients(account_resources):
+    # Inventory as published by updateProfile.post_to_google_sheets, without reading it back from the sheet
+    rows = [[name, amount] for name, amount in sorted(account_resources.items()) if not name.startswith("Unknown Item")]
+    return parse_player_ingredient_rows(rows)
+
+
+def fetch_crafting_requests(workbook, config, cache):
+    """
+    Requested items and quantities from the DASHBOARD, one entry per item: rows naming the same item
+    are summed, and malformed rows are skipped with a warning instead of failing the run.
+    """
+    first_row = parse_a1_range(config.crafting_data_fetch_range)[0] + 1
+    crafting_requests = {}
+    row_count = 0
+    skipped_rows = 0
+    for rows in crafting_request_pages(workbook, config, cache):
+        for row in rows:
+            row_number = first_row + row_count
+            row_count += 1
+            try:
+                request = parse_crafting_request_row(row)
+            except ValueError as e:
+                skipped_rows += 1
+                if skipped_rows <= MAX_LOGGED_REQUEST_ERRORS:
+                    logging.warning(f"Skipping {config.crafting_data_fetch_sheet} row {row_number}: {e}")
+                continue
+            if request is not None:
+                item_name, quantity = request
+                crafting_requests[item_name] = crafting_requests.get(item_name, 0) + quantity
+
+    if skipped_rows:
+        logging.warning(f"Skipped {skipped_rows} malformed crafting request rows")
+    logging.info(f"Crafting requests fetched: {len(crafting_requests)} items from {row_count} rows")
+    if len(crafting_requests) <= 50:
+        logging.info(f"Crafting requests: {list(crafting_requests.items())}")
+    return list(crafting_requests.items())
+
+
+def crafting_request_pages(workbook, config, cache):
+    # Rows of the request range; an open-ended range (A5:B) is read a page at a time up to the sheet's last row
+    sheet_title, page_rows = config.crafting_data_fetch_sheet, config.crafting_request_page_rows
+    start_row, start_column, end_row, end_column = parse_a1_range(config.crafting_data_fetch_range)
+    if end_row is not None or page_rows <= 0:
+        yield fetch_data_with_caching(cache, workbook, sheet_title, config.crafting_data_fetch_range, ttl=config.cache_expiry) or []
+        return
+
+    worksheet = get_worksheet(workbook, sheet_title)
+    if worksheet is None:
+        return
+    # A page with only blank rows is not the end of the data, more requests can follow further down;
+    # the sheet's row count is, and reading past it fails
+    row_count = worksheet.row_count
+    first_column = column_letters(start_column + 1)
+    last_column = column_letters((end_column if end_column is not None else start_column + 1) + 1)
+    page_start = start_row + 1
+    while page_start <= row_count:
+        page_end = min(page_start + page_rows - 1, row_count)
+        rows = fetch_data_with_caching(cache, workbook, sheet_title, f"{first_column}{page_start}:{last_column}{page_end}", ttl=config.cache_expiry) or []
+        if page_end < row_count:
+            # Sheets leaves out trailing empty rows; pad them back so the rows of the next page keep their numbers
+            rows = rows + [[]] * (page_end - page_start + 1 - len(rows))
+        yield rows
+        page_start = page_end + 1
+
+
+def parse_request_quantity(value):
+    # '1,200', ' 3 ', 4 or '5.0' -> int; None for anything that is not a whole number
+    text = str(value).strip().replace(',', '').replace('\u00a0', '').replace(' ', '')
+    try:
+        quantity = Decimal(text)
+    except InvalidOperation:
+        return None
+    if not quantity.is_finite() or quantity != quantity.to_integral_value():
+        return None
+    return int(quantity)
+
+
+def parse_crafting_request_row(row):
+    # (item name as normalize_request_item spells it, quantity), None for blank rows and zero quantities;
+    # raises ValueError for malformed rows
+    item_name = str(row[0]).strip() if row else ''
+    quantity_text = str(row[1]).strip() if len(row) >= 2 else ''
+    if not item_name and not quantity_text:
+        return None
+    if not item_name:
+        raise ValueError(f"quantity '{quantity_text}' without an item name")
+    quantity = parse_request_quantity(quantity_text)
+    if quantity is None or quantity < 0:
+        raise ValueError(f"invalid quantity '{quantity_text}' for '{item_name}'")
+    if quantity == 0:
+        return None
+    return item_name.title(), quantity
+
+
+def normalize_request_item(item_name, variant_choices):
+    item_name_normalized = item_name.strip().title()
+
+    # Map variant group names such as 'Toolkit' and 'Framework' to the chosen recipe
+    return variant_choices.get(item_name_normalized, item_name_normalized)
+
+
+def aggregate_crafting_requests(crafting_requests, variant_choices):
+    # Sum the requested quantities per recipe once variant names have been resolved
+    requested_items = {}
+    for item_name, request_quantity in crafting_requests:
+        item_name_normalized = normalize_request_item(item_name, variant_choices)
+        requested_items[item_name_normalized] = requested_items.get(item_name_normalized, 0) + request_quantity
+    return requested_items
@@ -0,0 +1,117 @@
+import logging
+from planner.sheets import get_worksheet, post_table_to_sheet
+
+
+def post_ingredient_totals_to_sheet(worksheet, all_initial_ingredients, all_raw_ingredients, all_full_ingredients):
+    worksheet.clear()
+    logging.info("Worksheet cleared of old data.")
+
+    if all_initial_ingredients:
+        initial_ingredients_values = [['INGREDIENT', 'AMOUNT']] + [[ingredient, amount] for ingredient, amount in sorted(all_initial_ingredients.items())]
+        worksheet.update('A1:B' + str(len(initial_ingredients_values)), initial_ingredients_values)
+        logging.info("Batch update completed for initial ingredients and quantities.")
+
+    full_ingredients_sorted = sorted(all_full_ingredients.items())
+    full_ingredients_values = [['FULL INGREDIENTS', 'AMOUNT']] + [[ingredient, amount] for ingredient, amount in full_ingredients_sorted]
+    worksheet.update('G1:H' + str(len(full_ingredients_values)), full_ingredients_values)
+
+    raw_ingredients_sorted = sorted(all_raw_ingredients.items())
+    raw_ingredients_values = [['RAW INGREDIENT', 'AMOUNT']] + [[ingredient, amount] for ingredient, amount in raw_ingredients_sorted]
+    worksheet.update('D1:E' + str(len(raw_ingredients_values)), raw_ingredients_values)
+
+    logging.info("Updated worksheet with initial, full, and raw ingredients.")
+
+
+def post_needed_ingredients_to_sheet(worksheet, needed_ingredients, mint_to_name, name_to_mint):
+    # Prepare the data for the needed ingredients list
+    needed_ingredients_values = [['NEEDED INGREDIENTS', 'AMOUNT']]
+    
+    # Sort the ingredients alphabetically by name before adding to the list
+    for ingredient_name in sorted(needed_ingredients.keys()):
+        amount = needed_ingredients[ingredient_name]
+        mint_address = name_to_mint.get(ingredient_name, "Unknown Ingredient: " + ingredient_name)
+        resolved_name = mint_to_name.get(mint_address, "Unknown Ingredient: " + mint_address)
+        needed_ingredients_values.append([resolved_name, amount])
+
+    # Update the worksheet with needed ingredients in columns J and K
+    worksheet.update('J1:K' + str(len(needed_ingredients_values)), needed_ingredients_values)
+
+
+def post_max_craftable_to_sheet(worksheet, max_craftable_table, start_cell, clear_first=False):
+    max_craftable_values = [['CRAFTABLE NOW', 'MAX QUANTITY']] + [[recipe_name, quantity] for recipe_name, quantity in max_craftable_table]
+    post_table_to_sheet(worksheet, start_cell, max_craftable_values, clear_first)
+
+
+def post_schedule_to_sheet(worksheet, schedule, start_cell, clear_first=False):
+    schedule_values = [
+        ['MAKESPAN (S)', schedule['makespan'], 'TOTAL FEES (ATLAS)', round(schedule['total_fees'], 8),
+         'SLOT UTILIZATION', f"{schedule['utilization']:.1%} of {schedule['slots']}"],
+        ['CRAFT JOB', 'CRAFTS', 'SLOT', 'START (S)', 'FINISH (S)', 'FEE (ATLAS)']
+    ]
+    for job in schedule['jobs']:
+        schedule_values.append([job['recipe'], job['crafts'], job['slot'], job['start'], job['finish'], round(job['fee'], 8)])
+    post_table_to_sheet(worksheet, start_cell, schedule_values, clear_first)
+
+
+def post_procurement_to_sheet(worksheet, procurement, start_cell, clear_first=False):
+    procurement_values = [
+        ['TOTAL COST (ATLAS)', procurement['total'], 'PURCHASES (ATLAS)', procurement['purchases'], 'CRAFT FEES (ATLAS)', procurement['fees']],
+        ['PROCURE', 'ACTION', 'RECIPE', 'QUANTITY', 'UNIT COST (ATLAS)', 'COST (ATLAS)']
+    ]
+    for row in procurement['rows']:
+        unit_cost, cost = ('NO PRICE', 'NO PRICE') if row['cost'] is None else (row['unit_cost'], row['cost'])
+        procurement_values.append([row['item'], row['action'].upper(), row['recipe'] or '', row['quantity'], unit_cost, cost])
+    post_table_to_sheet(worksheet, start_cell, procurement_values, clear_first)
+
+
+def post_bottlenecks_to_sheet(worksheet, bottleneck_table, start_cell, clear_first=False):
+    bottleneck_values = [['BOTTLENECK', 'SHORTFALL SAVED PER UNIT']] + [[item_name, value] for item_name, value in bottleneck_table]
+    post_table_to_sheet(worksheet, start_cell, bottleneck_values, clear_first)
+
+
+def optional_results_worksheet(workbook, results_worksheet, sheet_title, config):
+    # Tables on the results sheet are cleared along with it; tables on other sheets clear their own columns
+    if sheet_title == config.crafting_results_sheet:
+        return results_worksheet, False
+    return get_worksheet(workbook, sheet_title), True
+
+
+def publish_results(sink, results, mint_to_name, name_to_mint, config):
+    # Write the results of a run, freshly computed or from the result memo, to the results worksheets
+    results_worksheet = get_worksheet(sink, config.crafting_results_sheet)
+    if results_worksheet is None:
+        return False
+
+    # Post initial ingredients, full ingredient list, and raw ingredients to the sheet
+    post_ingredient_totals_to_sheet(results_worksheet, results['initial'], results['raw'], results['full'])
+    logging.info("Ingredients with quantities posted successfully")
+
+    # Post needed ingredients to the sheet
+    post_needed_ingredients_to_sheet(results_worksheet, results['needed'], mint_to_name, name_to_mint)
+    logging.info("Needed ingredients with quantities posted successfully")
+
+    if config.bottleneck_results_range:
+        worksheet, clear_first = optional_results_worksheet(sink, results_worksheet, config.bottleneck_results_sheet, config)
+        if worksheet is not None:
+            post_bottlenecks_to_sheet(worksheet, results['bottlenecks'], config.bottleneck_results_range, clear_first)
+            logging.info("Bottleneck items posted successfully")
+
+    if config.max_craftable_results_range:
+        worksheet, clear_first = optional_results_worksheet(sink, results_worksheet, config.max_craftable_results_sheet, config)
+        if worksheet is not None:
+            post_max_craftable_to_sheet(worksheet, results['max_craftable'], config.max_craftable_results_range, clear_first)
+            logging.info("Max craftable quantities posted successfully")
+
+    if config.crafting_schedule_range:
+        worksheet, clear_first = optional_results_worksheet(sink, results_worksheet, config.crafting_schedule_sheet, config)
+        if worksheet is not None:
+            post_schedule_to_sheet(worksheet, results['schedule'], config.crafting_schedule_range, clear_first)
+            logging.info("Crafting schedule posted successfully")
+
+    # Only computed when a price table is configured
+    if results.get('procurement') is not None:
+        worksheet, clear_first = optional_results_worksheet(sink, results_worksheet, config.procurement_results_sheet, config)
+        if worksheet is not None:
+            post_procurement_to_sheet(worksheet, results['procurement'], config.procurement_results_range, clear_first)
+            logging.info("Procurement list posted successfully")
+    return True
@@ -0,0 +1,18 @@
+import logging
+import warnings
+from dotenv import load_dotenv
+
+
+def init_script(log_file="debug.log"):
+    """
+    Process-wide setup of the command line scripts: .env is loaded into the environment and logging
+    goes to log_file and stderr. Code embedding the planner configures these itself.
+    """
+    # Suppress DeprecationWarning
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s',
+                        handlers=[logging.FileHandler(log_file),
+                                  logging.StreamHandler()])
+    logging.info("Script started")
@@ -0,0 +1,59 @@
+import logging
+import re
+
+
+def fetch_data_with_caching(cache, workbook, sheet_title, data_range, ttl=3600):
+    cache_key = f"{workbook.key}_{sheet_title}_{data_range}"
+    data = cache.get(cache_key)
+    if data is None:
+        worksheet = get_worksheet(workbook, sheet_title)
+        if worksheet:
+            data = worksheet.get(data_range)
+            cache.set(cache_key, data, ttl)
+    return data
+
+
+# Google Sheets integration functions; workbook is the spreadsheet or a local stand-in, see planIO.py
+def get_worksheet(workbook, sheet_title):
+    try:
+        return workbook.worksheet(sheet_title)
+    except Exception as e:
+        logging.error(f"Failed to access worksheet {sheet_title}: {e}")
+        return None
+
+
+def column_number(column_letters):
+    number = 0
+    for letter in column_letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+def column_letters(column_number):
+    letters = ''
+    while column_number:
+        column_number, remainder = divmod(column_number - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def split_cell(cell):
+    # 'P12' -> ('P', 12)
+    column, row = re.fullmatch(r'([A-Z]+)(\d+)', cell.strip().upper()).groups()
+    return column, int(row)
+
+
+def table_range(start_cell, row_count, column_count):
+    # A1 range of a table of the given size whose top left corner is start_cell, e.g. P1 -> P1:Q20
+    column, row = split_cell(start_cell)
+    end_column = column_letters(column_number(column) + column_count - 1)
+    return f"{column}{row}:{end_column}{row + row_count - 1}"
+
+
+def post_table_to_sheet(worksheet, start_cell, values, clear_first=False):
+    if clear_first:
+        # Clear the table's columns so rows left over from a longer previous table disappear
+        column, row = split_cell(start_cell)
+        end_column = column_letters(column_number(column) + len(values[0]) - 1)
+        worksheet.batch_clear([f"{column}{row}:{end_column}"])
+    worksheet.update(table_range(start_cell, len(values), len(values[0])), values)
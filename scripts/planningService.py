@@ -0,0 +1,309 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import numpy as np
+import metrics
+from craftScheduler import schedule_crafts
+from maxCraftable import max_craftable
+from nettingEngine import NettingGraph
+from planner import Planner, PlannerConfig, PlannerError
+from planner.inputs import aggregate_crafting_requests, faction_crystal_variants, normalize_request_item, player_variant_preferences
+from planner.script import init_script
+from resultMemo import canonical_json
+from variantOptimizer import choose_variants, selection_vector
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _whole_number(value, field, minimum):
+    # A whole number of at least minimum, written like a sheet cell ("1,000") or as a JSON number
+    try:
+        number = int(str(value).replace(',', ''))
+    except ValueError:
+        raise BadRequest(f"'{field}' must be a whole number, got {value!r}")
+    if number < minimum:
+        raise BadRequest(f"'{field}' must be at least {minimum}, got {number}")
+    return number
+
+
+def _quantities(value, field, minimum=1):
+    # {item: quantity} or [[item, quantity], ...] -> [(item, int quantity)]
+    if value is None:
+        return []
+    try:
+        pairs = [(str(name), quantity) for name, quantity in (value.items() if isinstance(value, dict) else value)]
+    except (TypeError, ValueError) as e:
+        raise BadRequest(f"'{field}' must map item names to whole quantities: {e}")
+    return [(name, _whole_number(quantity, f"{field}.{name}", minimum)) for name, quantity in pairs]
+
+
+def _named(graph, vector):
+    # Non-zero entries of a [mint] vector by item name
+    return {graph.names[index]: int(vector[index]) for index in np.flatnonzero(vector)}
+
+
+# Catalog, netting graph and response cache shared by every request. Reloading swaps in a new
+# state object, so requests in flight finish on the catalog they started with.
+class PlanningState:
+    def __init__(self, catalog, config):
+        self.catalog = catalog
+        self.config = config
+        self.graph = NettingGraph(catalog)
+        self.loaded_at = time.time()
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+
+    def cached(self, endpoint, body, compute):
+        cache_size = self.config.planning_service_cache_size
+        if cache_size <= 0:
+            return compute(body)
+        key = endpoint + canonical_json(body)
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                metrics.inc('planner_service_cache_lookups_total', result='hit')
+                return self.cache[key]
+        metrics.inc('planner_service_cache_lookups_total', result='miss')
+        response = compute(body)
+        with self.cache_lock:
+            self.cache[key] = response
+            while len(self.cache) > cache_size:
+                self.cache.popitem(last=False)
+        return response
+
+    def _requests(self, body):
+        # Requested items must be craftable: a recipe such as 'Framework 1', or an item with a recipe
+        crafting_requests = _quantities(body.get('requests'), 'requests')
+        graph = self.graph
+        unknown = []
+        for name, _ in crafting_requests:
+            item_name = normalize_request_item(name, {})
+            mint_index = graph.mint_index.get(self.catalog.name_to_mint.get(item_name))
+            if item_name not in graph.recipe_index and (mint_index is None or not graph.producers[mint_index]):
+                unknown.append(name)
+        if unknown:
+            raise BadRequest(f"No recipe for requested items: {', '.join(unknown)}")
+        return crafting_requests
+
+    def _inventory(self, body):
+        # Any item of the NFT data may be held, including ones no recipe uses; none of them below zero
+        inventory = _quantities(body.get('inventory'), 'inventory', minimum=0)
+        unknown = [name for name, _ in inventory if name not in self.catalog.name_to_mint]
+        if unknown:
+            raise BadRequest(f"Unknown inventory items: {', '.join(unknown)}")
+        return dict(inventory)
+
+    def _schedule_options(self, schedule):
+        # true for the configured defaults, or {"slots": ..., "batch_size": ...}
+        if schedule is True:
+            schedule = {}
+        if not isinstance(schedule, dict):
+            raise BadRequest("'schedule' must be true or an object with 'slots' and 'batch_size'")
+        unknown = set(schedule) - {'slots', 'batch_size'}
+        if unknown:
+            raise BadRequest(f"Unknown schedule options: {', '.join(sorted(unknown))}")
+        slots = _whole_number(schedule.get('slots', self.config.crafting_slots), 'schedule.slots', 1)
+        batch_size = _whole_number(schedule.get('batch_size', self.config.craft_batch_size), 'schedule.batch_size', 0)
+        return slots, batch_size
+
+    def _preferences(self, body):
+        # Variant choices as on the PROFILE tab: a recipe, its PROFILE label or 'none'; faction MUD, ONI or USTUR
+        choices = {}
+        for field in ('framework', 'toolkit', 'crystal', 'faction'):
+            value = body.get(field)
+            if value is not None and not isinstance(value, str):
+                raise BadRequest(f"'{field}' must be a string, got {type(value).__name__}")
+            choices[field] = value
+        faction = choices['faction'].strip().upper() if choices['faction'] else None
+        if faction and faction not in faction_crystal_variants:
+            raise BadRequest(f"Unknown faction '{choices['faction']}', expected one of {', '.join(faction_crystal_variants)}")
+        pinned, preferred = player_variant_preferences(choices, choices['crystal'], faction)
+
+        graph = self.graph
+        group_options = dict(zip(graph.group_names, graph.group_options))
+        for group, recipe in pinned.items():
+            options = group_options.get(group)
+            if recipe not in graph.recipe_index or (options is not None and recipe not in options):
+                raise BadRequest(f"Unknown {group} choice '{recipe}'" + (f", expected one of {', '.join(options)}" if options else ""))
+        return pinned, preferred
+
+    def _inputs(self, body):
+        crafting_requests = self._requests(body)
+        inventory = self._inventory(body)
+        pinned, preferred = self._preferences(body)
+        variant_choices = choose_variants(self.graph, aggregate_crafting_requests(crafting_requests, {}), inventory, pinned, preferred)
+        requested_items = aggregate_crafting_requests(crafting_requests, variant_choices)
+        return requested_items, inventory, variant_choices
+
+    def _net(self, requested_items, inventory, variant_choices):
+        graph = self.graph
+        return graph.net(graph.mint_vector(inventory), *graph.order_vectors(requested_items), selection_vector(graph, variant_choices))
+
+    def plan(self, body):
+        # Options are checked before any work is done, so a bad request costs no netting
+        schedule_options = self._schedule_options(body['schedule']) if body.get('schedule') else None
+        requested_items, inventory, variant_choices = self._inputs(body)
+        result = self._net(requested_items, inventory, variant_choices)
+        graph = self.graph
+        crafts = result.crafts[0]
+        fees = sum(int(crafts[r]) * self.catalog.recipes[name]['fee'] for r, name in enumerate(graph.recipe_names) if crafts[r])
+        response = {
+            'variants': variant_choices,
+            'requests': requested_items,
+            'crafts': {graph.recipe_names[r]: int(crafts[r]) for r in np.flatnonzero(crafts)},
+            'gross': _named(graph, result.gross[0]),
+            'needed': _named(graph, result.net[0]),
+            'shortfall': _named(graph, result.shortfall[0]),
+            'total_shortfall': int(result.total_shortfall()[0]),
+            'fees': round(fees, 8)
+        }
+        if schedule_options is not None:
+            response['schedule'] = schedule_crafts(graph, crafts, *schedule_options)
+        return json.loads(canonical_json(response))
+
+    def shortfall(self, body):
+        requested_items, inventory, variant_choices = self._inputs(body)
+        result = self._net(requested_items, inventory, variant_choices)
+        return {
+            'variants': variant_choices,
+            'shortfall': _named(self.graph, result.shortfall[0]),
+            'total_shortfall': int(result.total_shortfall()[0])
+        }
+
+    def max_craftable(self, body):
+        inventory = self._inventory(body)
+        pinned, _ = self._preferences(body)
+        table = max_craftable(self.graph, inventory, pinned)
+        return {'max_craftable': [{'recipe': recipe_name, 'quantity': quantity} for recipe_name, quantity in table]}
+
+
+class PlanningHandler(BaseHTTPRequestHandler):
+    server_version = 'PlanningService/1'
+    endpoints = {'/plan': 'plan', '/shortfall': 'shortfall', '/max-craftable': 'max_craftable'}
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/health':
+            state = self.server.state
+            self._send_json(200, {'status': 'ok', 'recipes': len(state.catalog.recipes), 'loaded_at': state.loaded_at})
+        elif path == '/metrics':
+            body = metrics.render().encode('utf-8')
+            self._send(200, body, 'text/plain; version=0.0.4; charset=utf-8')
+        else:
+            self._send_json(404, {'error': f"Unknown path {path}"})
+
+    def do_POST(self):
+        path = self.path.split('?')[0]
+        started = time.perf_counter()
+        status = 500
+        try:
+            if path == '/reload':
+                self.server.reload()
+                status, response = 200, {'status': 'reloaded', 'recipes': len(self.server.state.catalog.recipes)}
+            elif path in self.endpoints:
+                body = self._read_json()
+                state = self.server.state
+                method = getattr(state, self.endpoints[path])
+                status, response = 200, state.cached(path, body, method)
+            else:
+                status, response = 404, {'error': f"Unknown path {path}"}
+        except BadRequest as e:
+            status, response = 400, {'error': str(e)}
+        except Exception as e:
+            logging.exception(f"Failed to handle {path}")
+            status, response = 500, {'error': f"{type(e).__name__}: {e}"}
+        finally:
+            # Unknown paths share one label so scanners cannot grow the metrics without bound
+            endpoint = path if path in self.endpoints or path == '/reload' else 'other'
+            metrics.inc('planner_service_requests_total', endpoint=endpoint, status=status)
+            metrics.observe('planner_service_request_seconds', time.perf_counter() - started, endpoint=endpoint)
+        self._send_json(status, response)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        max_body = self.server.planner.config.planning_service_max_body
+        if length > max_body:
+            raise BadRequest(f"Request body over {max_body} bytes")
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as e:
+            raise BadRequest(f"Invalid JSON: {e}")
+        if not isinstance(body, dict):
+            raise BadRequest("Request body must be a JSON object")
+        return body
+
+    def _send_json(self, status, response):
+        self._send(status, json.dumps(response).encode('utf-8'), 'application/json')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+# HTTP server answering requests on a fixed pool of worker threads. The planner loads the catalog
+# and supplies the service settings and the defaults, such as crafting slots, of requests that do
+# not set them.
+class PlanningServer(HTTPServer):
+    def __init__(self, address, planner, workers=None):
+        self.planner = planner
+        self.state = PlanningState(planner.catalog, planner.config)
+        self.reload_lock = threading.Lock()
+        self.workers = workers or planner.config.planning_service_workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='planning')
+        super().__init__(address, PlanningHandler)
+
+    def reload(self):
+        with self.reload_lock:
+            # Raises PlannerError when the source files cannot be read; the current catalog keeps serving
+            self.state = PlanningState(self.planner.load_catalog(), self.planner.config)
+        logging.info(f"Reloaded catalog with {len(self.state.catalog.recipes)} recipes")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def main():
+    init_script()
+    config = PlannerConfig.from_env()
+    try:
+        server = PlanningServer((config.planning_service_host, config.planning_service_port), Planner(config))
+    except PlannerError as e:
+        logging.error(f"{e}. Exiting.")
+        sys.exit(1)
+    logging.info(f"Planning service listening on http://{config.planning_service_host}:{server.server_address[1]} with {server.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Planning service stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import numpy as np
+
+
+def _price(value):
+    price = float(str(value).replace(',', '').strip())
+    if not math.isfinite(price) or price < 0:
+        raise ValueError(f"invalid price {value!r}")
+    return price
+
+
+def _price_mint(key, name_to_mint):
+    key = str(key).strip()
+    return name_to_mint.get(key) or name_to_mint.get(key.title()) or key
+
+
+def load_price_table(file_path, name_to_mint):
+    """
+    Unit prices by mint from a local price table. A CSV file needs a price column and a mint, name
+    or item column; a JSON file is either {mint or name: price} or a list of such records.
+    Rows without a usable price are skipped, an empty price means the item cannot be bought.
+    """
+    if file_path.lower().endswith('.json'):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        records = [{'mint': key, 'price': price} for key, price in data.items()] if isinstance(data, dict) else data
+    else:
+        with open(file_path, 'r', encoding='utf-8', newline='') as file:
+            records = [{column.strip().lower(): value for column, value in row.items() if column} for row in csv.DictReader(file)]
+
+    prices = {}
+    skipped = 0
+    for record in records:
+        key = record.get('mint') or record.get('name') or record.get('item')
+        if not key or record.get('price') in (None, ''):
+            continue
+        try:
+            prices[_price_mint(key, name_to_mint)] = _price(record['price'])
+        except ValueError as e:
+            skipped += 1
+            logging.warning(f"Ignoring price of '{key}': {e}")
+    logging.info(f"Loaded {len(prices)} prices from {file_path}" + (f", skipped {skipped}" if skipped else ""))
+    return prices
+
+
+# Buy-or-craft decisions over the compiled recipe graph. The recipe structure is indexed once, so the
+# whole catalog can be priced again in one pass whenever the price table changes.
+class ProcurementGraph:
+    def __init__(self, graph, pinned=None):
+        self.graph = graph
+        pinned = pinned or {}
+        self.fees = np.array([graph.catalog.recipes[name]['fee'] for name in graph.recipe_names])
+        # Recipes considered per mint; a variant group the player pinned only considers that recipe
+        self.candidates = []
+        for index, producers in enumerate(graph.producers):
+            if index in graph.group_of and pinned.get(graph.names[index]) in graph.recipe_index:
+                producers = [r for r in producers if graph.recipe_names[r] == pinned[graph.names[index]]] or producers
+            self.candidates.append(producers)
+        # Ingredients of each recipe as index and amount arrays; edges closing a cycle are left out, as in the netting
+        self.recipe_input_indices = []
+        self.recipe_input_amounts = []
+        for r, inputs in enumerate(graph.recipe_inputs):
+            forward = [(input_index, amount) for input_index, amount in inputs if input_index > graph.recipe_outputs[r]]
+            self.recipe_input_indices.append(np.array([input_index for input_index, _ in forward], dtype=np.int64))
+            self.recipe_input_amounts.append(np.array([amount for _, amount in forward], dtype=np.float64))
+
+    def price_vector(self, prices):
+        # [mint] unit prices, inf for mints that cannot be bought
+        vector = np.full(len(self.graph.mints), np.inf)
+        for mint, price in prices.items():
+            index = self.graph.mint_index.get(mint)
+            if index is not None:
+                vector[index] = price
+        return vector
+
+    def unit_costs(self, prices):
+        """
+        Cheapest way to obtain one unit of every mint, by dynamic programming from the raw ingredients
+        up: a mint costs the lower of its price and, over its recipes, (fee + cost of the ingredients
+        of one craft) / output amount. Returns the [mint] unit costs (inf when the mint can neither be
+        bought nor crafted from buyable ingredients), the cheapest recipe per mint (-1 for none) and
+        whether buying is the cheapest option.
+        """
+        graph = self.graph
+        buy_prices = self.price_vector(prices)
+        costs = buy_prices.copy()
+        best_recipe = np.full(len(graph.mints), -1, dtype=np.int64)
+        craft_costs = np.full(len(graph.mints), np.inf)
+        for index in reversed(range(len(graph.mints))):
+            for r in self.candidates[index]:
+                craft_cost = (self.fees[r] + costs[self.recipe_input_indices[r]] @ self.recipe_input_amounts[r]) / graph.output_amounts[r]
+                if best_recipe[index] < 0 or craft_cost < craft_costs[index]:
+                    best_recipe[index] = r
+                    craft_costs[index] = craft_cost
+            costs[index] = min(buy_prices[index], craft_costs[index])
+        # Raw mints can only be bought; a tie goes to crafting
+        buy = (buy_prices < craft_costs) | (best_recipe < 0)
+        return costs, best_recipe, buy
+
+    def procure(self, prices, inventory, mint_orders, recipe_orders):
+        """
+        Minimum cost procurement list for the orders, after using the inventory. Orders are crafted,
+        as the planner crafts them: mint orders with their cheapest recipe, recipe orders with that
+        exact recipe. Every ingredient is then bought or crafted, whichever is cheaper.
+        Returns a dict with a row per purchase and per crafted recipe, and the cost totals.
+        """
+        graph = self.graph
+        costs, best_recipe, buy = self.unit_costs(prices)
+        buy_prices = self.price_vector(prices)
+        inventory = np.asarray(inventory, dtype=np.int64)
+        gross = np.zeros(len(graph.mints), dtype=np.int64)
+        bought = np.zeros(len(graph.mints), dtype=np.int64)
+        crafts = np.zeros(len(graph.recipe_names), dtype=np.int64)
+
+        # Products before their ingredients, so every demand on a mint is known when it is reached
+        for index in range(len(graph.mints)):
+            need = max(int(gross[index] - inventory[index]), 0)
+            r = int(best_recipe[index])
+            if r < 0 or buy[index]:
+                bought[index] = need
+                need = 0
+            routed = [(r, need + int(mint_orders[index]))] if r >= 0 else []
+            routed += [(recipe, int(recipe_orders[recipe])) for recipe in graph.producers[index] if recipe_orders[recipe]]
+            for recipe, quantity in routed:
+                if quantity <= 0:
+                    continue
+                recipe_crafts = -(-quantity // int(graph.output_amounts[recipe]))
+                crafts[recipe] += recipe_crafts
+                for input_index, amount in zip(self.recipe_input_indices[recipe], self.recipe_input_amounts[recipe]):
+                    gross[input_index] += recipe_crafts * int(amount)
+
+        rows = []
+        for index in np.flatnonzero(bought):
+            price = float(buy_prices[index]) if np.isfinite(buy_prices[index]) else None
+            rows.append({
+                'item': graph.names[index], 'action': 'buy', 'recipe': None, 'quantity': int(bought[index]),
+                'unit_cost': price, 'cost': None if price is None else round(price * int(bought[index]), 8)
+            })
+        for r in np.flatnonzero(crafts):
+            rows.append({
+                'item': graph.names[graph.recipe_outputs[r]], 'action': 'craft', 'recipe': graph.recipe_names[r], 'quantity': int(crafts[r]),
+                'unit_cost': float(self.fees[r]), 'cost': round(float(self.fees[r]) * int(crafts[r]), 8)
+            })
+        rows.sort(key=lambda row: (row['action'], row['item'], row['recipe'] or ''))
+
+        purchases = sum(row['cost'] for row in rows if row['action'] == 'buy' and row['cost'] is not None)
+        fees = sum(row['cost'] for row in rows if row['action'] == 'craft')
+        unpriced = [row['item'] for row in rows if row['action'] == 'buy' and row['cost'] is None]
+        if unpriced:
+            logging.warning(f"No price for {len(unpriced)} items that have to be bought: {unpriced[:10]}")
+        return {
+            'rows': rows,
+            'purchases': round(purchases, 8),
+            'fees': round(fees, 8),
+            'total': round(purchases + fees, 8),
+            'unpriced': len(unpriced)
+        }
+
+    def catalog_costs(self, prices):
+        # One row per mint of the catalog with its cheapest unit cost and how it is obtained
+        costs, best_recipe, buy = self.unit_costs(prices)
+        graph = self.graph
+        return [
+            {
+                'item': graph.names[index],
+                'unit_cost': round(float(costs[index]), 8) if np.isfinite(costs[index]) else None,
+                'action': ('buy' if buy[index] else 'craft') if np.isfinite(costs[index]) else 'unavailable',
+                'recipe': graph.recipe_names[best_recipe[index]] if np.isfinite(costs[index]) and not buy[index] else None
+            }
+            for index in range(len(graph.mints))
+        ]
+
+
+def main():
+    # Imported here, the planner package imports this module
+    from nettingEngine import NettingGraph
+    from planner import Planner, PlannerConfig
+    from planner.script import init_script
+    init_script()
+    config = PlannerConfig.from_env()
+
+    parser = argparse.ArgumentParser(description="Price every item of the recipe catalog as the cheaper of buying and crafting it.")
+    parser.add_argument('prices', nargs='?', default=config.procurement_price_file, help="CSV or JSON price table, see load_price_table")
+    parser.add_argument('--output', help="write the table to this CSV file instead of printing it")
+    args = parser.parse_args()
+    if not args.prices:
+        parser.error("no price table given and PROCUREMENT_PRICE_FILE is not set")
+
+    catalog = Planner(config).catalog
+    procurement = ProcurementGraph(NettingGraph(catalog))
+    rows = procurement.catalog_costs(load_price_table(args.prices, catalog.name_to_mint))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=['item', 'unit_cost', 'action', 'recipe'])
+            writer.writeheader()
+            writer.writerows(rows)
+        logging.info(f"Wrote {len(rows)} unit costs to {args.output}")
+    else:
+        for row in sorted(rows, key=lambda row: row['item']):
+            print(f"{row['item']}\t{row['unit_cost']}\t{row['action']}\t{row['recipe'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
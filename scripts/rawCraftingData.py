@@ -0,0 +1,124 @@
+import json
+import logging
+
+# Characters read from craftingDataRaw.json at a time
+READ_CHUNK_SIZE = 1024 * 1024
+ATLAS_DECIMALS = 8
+
+
+def iter_json_array(file, chunk_size=READ_CHUNK_SIZE):
+    # Yield the elements of a top level JSON array one at a time, reading the file in chunks
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    end_of_file = False
+    while True:
+        # Skip whitespace and separators; only an incomplete element needs more input
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != '[':
+                raise ValueError("Expected a JSON array")
+            started = True
+            position += 1
+            continue
+        if started and position < len(buffer) and buffer[position] == ']':
+            return
+        if position < len(buffer):
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+                # A scalar is only complete once its separator has been read, '12' may continue as '12.5'
+                following = buffer[end:].lstrip()
+                if isinstance(element, (dict, list)) or end_of_file or following[:1] in (',', ']'):
+                    position = end
+                    yield element
+                    continue
+            except json.JSONDecodeError:
+                if end_of_file:
+                    raise
+        elif end_of_file:
+            raise ValueError("Unexpected end of JSON array")
+
+        chunk = file.read(chunk_size)
+        end_of_file = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def hex_to_decimal_string(hex_string):
+    # Amounts are serialized by BN.js as hexadecimal strings
+    return str(int(hex_string, 16))
+
+
+def convert_fee_amount(raw_fee):
+    # Fee in ATLAS with 8 decimals, e.g. '5f5e100' -> '1.00000000'
+    units = int(raw_fee, 16)
+    return f"{units // 10 ** ATLAS_DECIMALS}.{units % 10 ** ATLAS_DECIMALS:0{ATLAS_DECIMALS}d}"
+
+
+def ascii_array_to_string(ascii_array):
+    return ''.join(chr(code) for code in ascii_array if code != 0)
+
+
+def status_string(status_code):
+    return {2: "ACTIVE", 3: "INACTIVE"}.get(status_code, "UNKNOWN")
+
+
+def reformat_recipe(recipe):
+    # Same record as reformatRecipes in src/formatCraftingData.ts
+    data = recipe['_data']
+    ingredients = [
+        {'amount': hex_to_decimal_string(ingredient['amount']), 'mint': ingredient['mint']}
+        for ingredient in recipe['_ingredientInputsOutputs']
+    ]
+    output = ingredients.pop() if ingredients else None  # The last ingredient is the recipe output
+
+    formatted_data = {
+        'version': hex_to_decimal_string(data['version']),
+        'category': data['category'],
+        'duration': hex_to_decimal_string(data['duration'])
+    }
+    if isinstance(data.get('namespace'), list):
+        formatted_data['namespace'] = ascii_array_to_string(data['namespace'])
+    formatted_data['status'] = status_string(data['status'])
+    formatted_data['feeAmount'] = convert_fee_amount(data['feeAmount'])
+
+    formatted = {'key': recipe['_key'], 'data': formatted_data, 'ingredients': ingredients}
+    if output is not None:
+        formatted['output'] = output
+    return formatted
+
+
+def iter_raw_crafting_data(file_path):
+    """
+    Active recipes of craftingDataRaw.json in the craftingDataFormat.json layout, decoded one recipe
+    at a time while the file is read, so the formatted file is not needed.
+    """
+    active_recipes = 0
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for recipe in iter_json_array(file):
+            if recipe['_data']['status'] != 2:
+                continue
+            active_recipes += 1
+            yield reformat_recipe(recipe)
+    logging.info(f"Number of active recipes: {active_recipes}")
+
+
+def main():
+    # Python replacement for src/formatCraftingData.ts
+    # Imported here, the planner package imports this module
+    from planner import PlannerConfig
+    from planner.script import init_script
+    init_script()
+    config = PlannerConfig.from_env()
+    raw_path = config.crafting_data_raw
+    format_path = config.crafting_data_format
+    formatted_recipes = list(iter_raw_crafting_data(raw_path))
+    with open(format_path, 'w', encoding='utf-8') as file:
+        json.dump(formatted_recipes, file, indent=2)
+    logging.info(f"Formatted recipes saved to {format_path}")
+
+
+if __name__ == "__main__":
+    main()
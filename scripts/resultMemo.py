@@ -0,0 +1,98 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from compiledCatalog import catalog_code_version
+
+# Bump whenever the planner computes different results from the same inputs
+RESULT_MEMO_VERSION = 2
+
+
+def _json_default(value):
+    # numpy scalars from the netting engine
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def canonical_json(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=_json_default)
+
+
+def catalog_fingerprint(catalog):
+    # Content of the recipe catalog, from the per-recipe hashes that also include the names of their mints
+    digest = hashlib.sha256()
+    for recipe_name, fingerprint in sorted(catalog.recipe_fingerprints.items()):
+        digest.update(canonical_json([recipe_name, fingerprint]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def input_fingerprint(inputs, catalog):
+    """
+    sha256 over everything a run's results depend on: the inputs dict (requests, inventory,
+    preferences, result settings), the recipe catalog and the code versions.
+    """
+    payload = {
+        'memo_version': RESULT_MEMO_VERSION,
+        'catalog_code_version': catalog_code_version(),
+        'catalog': catalog_fingerprint(catalog),
+        'inputs': inputs
+    }
+    return hashlib.sha256(canonical_json(payload).encode('utf-8')).hexdigest()
+
+
+# Finished results keyed by input fingerprint, most recently used kept, plus which fingerprint's
+# results were last written to the results workbook.
+class ResultMemo:
+    def __init__(self, state_file, max_entries):
+        self.state_file = state_file
+        self.max_entries = max_entries
+        self.entries = {}
+        self.published = None
+        if max_entries <= 0:
+            return
+        try:
+            with open(state_file, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+            self.entries = state['entries']
+            self.published = state.get('published')
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable result memo {state_file}: {e}")
+
+    def is_published(self, fingerprint, sink_key):
+        return self.published == {'fingerprint': fingerprint, 'sink': sink_key}
+
+    def get(self, fingerprint):
+        entry = self.entries.get(fingerprint)
+        if entry is None:
+            return None
+        entry['used_at'] = time.time()
+        return entry['results']
+
+    def put(self, fingerprint, results):
+        # Returns the results as stored, round tripped through JSON, so a later hit publishes exactly the same cells
+        results = json.loads(canonical_json(results))
+        if self.max_entries <= 0:
+            return results
+        self.entries[fingerprint] = {'results': results, 'used_at': time.time()}
+        while len(self.entries) > self.max_entries:
+            oldest = min(self.entries, key=lambda key: self.entries[key]['used_at'])
+            del self.entries[oldest]
+        return results
+
+    def mark_published(self, fingerprint, sink_key):
+        self.published = {'fingerprint': fingerprint, 'sink': sink_key}
+
+    def save(self):
+        if self.max_entries <= 0:
+            return
+        temp_path = f"{self.state_file}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({'entries': self.entries, 'published': self.published}, file, default=_json_default)
+            os.replace(temp_path, self.state_file)
+        except OSError as e:
+            logging.warning(f"Failed to write result memo {self.state_file}: {e}")
@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+import metrics
+
+
+def _process_alive(pid):
+    # Only POSIX can probe a process without touching it; elsewhere a file only goes stale with age
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Run coordination files of one spreadsheet: the lock, created exclusively by the run that holds it,
+# and the pending marker, created exclusively by the one run waiting for the lock. Both record their
+# owner process, which refreshes their modification time while it works or waits; a file left behind
+# by a process that died is taken over once the process is gone (same host) or the file has not been
+# refreshed for stale_seconds.
+class RunLock:
+    def __init__(self, lock_file, stale_seconds=1800):
+        self.lock_file = lock_file
+        self.stale_seconds = stale_seconds
+        self.owned = {}
+
+    def pending_file(self):
+        root, _ = os.path.splitext(self.lock_file)
+        return f"{root}.pending"
+
+    def read_owner(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Being written right now, or truncated by a crash; the file age decides
+            return {}
+
+    def is_stale(self, path, owner, max_age):
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except FileNotFoundError:
+            return False
+        if age > max_age:
+            return True
+        if not owner:
+            return False
+        return owner.get('host') == socket.gethostname() and not _process_alive(owner.get('pid', 0))
+
+    def _create(self, path, job):
+        # True when this process created path; a stale file is removed and created again once
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        owner = {'job': job, 'pid': os.getpid(), 'host': socket.gethostname(), 'created_at': round(time.time(), 3)}
+        for attempt in range(2):
+            try:
+                descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                current = self.read_owner(path)
+                if attempt or current is None or not self.is_stale(path, current, self.stale_seconds):
+                    return False
+                # Only remove the file that was judged stale, not one created by another process meanwhile
+                if self.read_owner(path) != current:
+                    return False
+                logging.warning(f"Taking over {path} left behind by {current or 'an unreadable owner'}")
+                metrics.inc('planner_run_lock_takeovers_total')
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+                json.dump(owner, file)
+            self.owned[path] = owner
+            return True
+        return False
+
+    def _remove(self, path):
+        if path in self.owned and self.read_owner(path) == self.owned.pop(path):
+            os.remove(path)
+
+    def refresh(self, path):
+        # Heartbeat of an owned file, so it is not taken over while its owner is still working
+        if path in self.owned and self.read_owner(path) == self.owned[path]:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def heartbeat(self, path):
+        # Refresh path from a daemon thread, several times per stale_seconds, until the block ends
+        stopped = threading.Event()
+
+        def beat():
+            while not stopped.wait(self.stale_seconds / 4):
+                self.refresh(path)
+
+        thread = threading.Thread(target=beat, name='run-lock-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def acquire(self, job):
+        return self._create(self.lock_file, job)
+
+    def release(self):
+        self._remove(self.lock_file)
+
+    def claim_pending(self, job):
+        return self._create(self.pending_file(), job)
+
+    def release_pending(self):
+        self._remove(self.pending_file())
+
+
+def single_flight(lock_file, job, run, stale_seconds=1800, poll_seconds=5):
+    """
+    Call run() unless another run on the same lock file is in flight. The first run requested meanwhile
+    becomes the pending run and waits for the lock; any further requests, of whichever job, collapse
+    into it and return 'queued' at once. The pending run gives up its marker when it starts, so a
+    request made during its run is pending again. Each spreadsheet thus has at most one active run and
+    one pending run. The lock and the marker are refreshed while their run works or waits, so they are
+    only taken over from a process that is gone or stopped refreshing them for stale_seconds. Returns the status of run() or 'queued'; an
+    empty lock_file disables the coordination.
+    """
+    if not lock_file:
+        return run()
+    lock = RunLock(lock_file, stale_seconds)
+    if not lock.acquire(job):
+        if not lock.claim_pending(job):
+            logging.info(f"A run is already pending on {lock_file}, nothing to queue")
+            metrics.inc('planner_run_triggers_total', job=job, result='queued')
+            return 'queued'
+        logging.info(f"Another run holds {lock_file}, waiting for it to finish")
+        try:
+            with lock.heartbeat(lock.pending_file()):
+                while not lock.acquire(job):
+                    time.sleep(poll_seconds)
+        finally:
+            # This run covers every request made before it starts
+            lock.release_pending()
+
+    metrics.inc('planner_run_triggers_total', job=job, result='run')
+    try:
+        with lock.heartbeat(lock_file):
+            return run()
+    finally:
+        lock.release()
@@ -0,0 +1,132 @@
+import gc
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import metrics
+from nettingEngine import netting_graph
+from planner import Planner, PlannerConfig, PlannerError
+from planner.script import init_script
+
+# Per worker process state: the catalog and its netting graph are inherited from the parent when the
+# pool forks and loaded from the compiled artifact once per worker otherwise, the Sheets client is
+# authenticated on the first profile
+_config = None
+_catalog = None
+_client = None
+
+
+def _init_worker(config):
+    global _config, _catalog
+    # Metrics inherited from a forked parent are already counted there
+    metrics.drain()
+    _config = config
+    if _catalog is None:
+        _catalog = Planner(config).load_catalog()
+    netting_graph(_catalog)
+
+
+def _run_profile(spreadsheet_id):
+    global _client
+    started = time.monotonic()
+    try:
+        planner = Planner(_config.replace(spreadsheet_id=spreadsheet_id), _client, _catalog)
+        if _client is None and _config.uses_google_sheets():
+            _client = planner.client
+        status = planner.single_flight('plan', planner.run)
+        error = None
+    except Exception as e:
+        status = 'failed'
+        error = f"{type(e).__name__}: {e}"
+    # The parent adds the worker's metrics to its own, so one export covers every profile
+    return {'spreadsheet_id': spreadsheet_id, 'status': status, 'error': error, 'pid': os.getpid(), 'seconds': time.monotonic() - started,
+            'metrics': metrics.drain()}
+
+
+def run_profiles(spreadsheet_ids, config, workers=None):
+    """
+    Run the crafting plan for every spreadsheet on a pool of worker processes (config.process_pool_workers
+    unless workers is given). With the fork start method the catalog and its netting graph are built
+    once here and the workers start from copy-on-write pages of them; pages a worker touches, if only
+    to update reference counts, become its own copy. With spawn (macOS, Windows) every worker loads the
+    compiled catalog artifact and builds the graph once for all of its profiles. At most one profile per
+    worker is in flight and new profiles are started no faster than the Sheets request budget of the
+    config allows. Returns one result dict per spreadsheet, in the given order. Raises PlannerError when
+    the catalog cannot be loaded.
+    """
+    global _catalog
+    workers = workers or config.process_pool_workers or os.cpu_count() or 1
+    workers = max(min(workers, len(spreadsheet_ids)), 1)
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        _catalog = Planner(config).load_catalog()
+        netting_graph(_catalog)
+        # Keep the garbage collector from touching the inherited catalog objects, which would copy their pages
+        gc.freeze()
+    else:
+        context = multiprocessing.get_context('spawn')
+
+    requests_per_minute = config.sheets_requests_per_minute
+    submit_interval = 60 * config.sheets_calls_per_profile / requests_per_minute if requests_per_minute > 0 else 0
+    logging.info(f"Running {len(spreadsheet_ids)} profiles on {workers} workers, starting one every {submit_interval:.1f}s")
+
+    results = {}
+    pending = list(spreadsheet_ids)
+    in_flight = {}
+    last_submit = None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(config,)) as executor:
+        while pending or in_flight:
+            while pending and len(in_flight) < workers:
+                if last_submit is not None:
+                    time.sleep(max(last_submit + submit_interval - time.monotonic(), 0))
+                spreadsheet_id = pending.pop(0)
+                in_flight[executor.submit(_run_profile, spreadsheet_id)] = spreadsheet_id
+                last_submit = time.monotonic()
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                spreadsheet_id = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died
+                    result = {'spreadsheet_id': spreadsheet_id, 'status': 'failed', 'error': f"{type(e).__name__}: {e}", 'pid': None, 'seconds': 0.0}
+                metrics.merge(result.pop('metrics', {}))
+                results[spreadsheet_id] = result
+                if result['status'] == 'failed':
+                    logging.error(f"Profile {spreadsheet_id} failed: {result['error']}")
+                else:
+                    logging.info(f"Profile {spreadsheet_id} {result['status']} in {result['seconds']:.1f}s (worker {result['pid']})")
+
+    return [results[spreadsheet_id] for spreadsheet_id in spreadsheet_ids]
+
+
+def main():
+    init_script()
+    config = PlannerConfig.from_env()
+    # Ids given on the command line take precedence over PROFILE_SPREADSHEET_IDS
+    spreadsheet_ids = sys.argv[1:] or [s.strip() for s in config.profile_spreadsheet_ids.split(',') if s.strip()]
+    if not spreadsheet_ids:
+        logging.error("No spreadsheets to update, pass their ids or set PROFILE_SPREADSHEET_IDS")
+        sys.exit(1)
+
+    metrics.start_http_server(config.metrics_port, config.metrics_host)
+    try:
+        results = run_profiles(spreadsheet_ids, config)
+    except PlannerError as e:
+        logging.error(f"{e}. Exiting.")
+        sys.exit(1)
+    metrics.write_textfile(config.metrics_textfile)
+    failed = [result for result in results if result['status'] == 'failed']
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    logging.info(f"Finished {len(results)} profiles: {counts}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
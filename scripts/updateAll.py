@@ -0,0 +1,42 @@
+import logging
+import sys
+import metrics
+import updateProfile
+from planner import Planner, PlannerConfig, PlannerError
+from planner.inputs import account_resources_to_ingredients
+from planner.script import init_script
+
+
+def main():
+    """
+    Refresh ACCOUNT_RESOURCES from the wallet and then run the crafting plan, in one process with one
+    authenticated client and one catalog. The fetched inventory is handed straight to the planner
+    instead of being read back from the sheet.
+    """
+    init_script()
+    config = PlannerConfig.from_env()
+    planner = Planner(config)
+    try:
+        catalog = planner.catalog
+        client = planner.client
+    except PlannerError as e:
+        logging.error(f"{e}. Exiting.")
+        sys.exit(1)
+
+    def refresh_and_plan():
+        account_resources = updateProfile.refresh_account_resources(client, catalog.mint_to_name, config)
+        if account_resources is None:
+            logging.error("Failed to refresh account resources")
+            return 'failed'
+        player_ingredients = account_resources_to_ingredients(account_resources)
+        return planner.run(client, catalog, player_ingredients)
+
+    # Holds the spreadsheet's run lock for the refresh and the plan together
+    status = planner.single_flight('all', refresh_and_plan)
+    metrics.write_textfile(config.metrics_textfile)
+    if status == 'failed':
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,53 @@
 import requests
-import json
-import os
 import logging
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from dotenv import load_dotenv
-import warnings
-
-# DeprecationWarning: [Deprecated][in version 6.0.0]: Method signature's arguments 'range_name' and 'values' will change their order. We recommend using named arguments for minimal impact. In addition, the argument 'values' will be mandatory of type: 'List[List]'. (ex) Worksheet.update(values = [[]], range_name=) sheet.update(range_name, values)
-warnings.filterwarnings("ignore", category=DeprecationWarning)
-
-# Set up logging
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s',
-                    handlers=[logging.FileHandler("debug.log"),
-                              logging.StreamHandler()])
-logging.info("Script started")
-
-# Load environment variables
-load_dotenv()
-
-# Global variables for sheet titles and ranges
-PLAYER_PROFILE_SHEET = os.getenv('PLAYER_PROFILE_SHEET')
-PLAYER_PROFILE_RANGE = os.getenv('PLAYER_PROFILE_RANGE')
-ACCOUNT_DATA_FETCH_SHEET = os.getenv('ACCOUNT_DATA_FETCH_SHEET')
-ACCOUNT_DATA_FETCH_RANGE = os.getenv('ACCOUNT_DATA_FETCH_RANGE')
-NODE_RPC_HOST = os.getenv('NODE_RPC_HOST')
-WALLET_LOOKUP_KEY = os.getenv('WALLET_LOOKUP_KEY')
-GOOGLE_CREDENTIALS_FILE = os.getenv('GOOGLE_CREDENTIALS_FILE')
-SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
-GALAXY_NFTS_DATA = os.getenv('GALAXY_NFTS_DATA')
-
-def load_json_file(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
-
-
-# Function to authenticate with Google Sheets
-def auth_gspread():
-    try:
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        creds = ServiceAccountCredentials.from_json_keyfile_name(GOOGLE_CREDENTIALS_FILE, scope)
-        client = gspread.authorize(creds)
-        return client
-    except Exception as e:
-        logging.error(f"Failed to authenticate with Google Sheets: {e}")
-        exit(1)
+import sys
+from compiledCatalog import load_nft_names
+from inventoryHistory import InventoryHistory
+from mintResolver import resolve_mint_names
+from planIO import MeasuredWorksheet
+from planner import Planner, PlannerConfig, PlannerError
+from planner.script import init_script
+import metrics
 
 
 # Function to get worksheet
-def get_worksheet(client, sheet_title):
+def get_worksheet(client, spreadsheet_id, sheet_title):
     try:
-        spreadsheet = client.open_by_key(SPREADSHEET_ID)
-        return spreadsheet.worksheet(sheet_title)
+        with metrics.timed_request('sheets', backend='sheets', operation='open'):
+            spreadsheet = client.open_by_key(spreadsheet_id)
+        return MeasuredWorksheet(spreadsheet.worksheet(sheet_title), 'sheets')
     except Exception as e:
         logging.error(f"Failed to access worksheet {sheet_title}: {e}")
         return None
     
 
-def fetch_blockchain_data(wallet_address):
+def fetch_blockchain_data(rpc_url, wallet_address):
     payload = {
         "jsonrpc": "2.0",
         "id": 1,
         "method": "getTokenAccountsByOwner",
         "params": [wallet_address, {"programId": "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"}, {"encoding": "jsonParsed"}]
     }
-    response = requests.post(NODE_RPC_HOST, headers={'Content-Type': 'application/json'}, json=payload)
-    data = response.json()
+    with metrics.timed_request('rpc', method='getTokenAccountsByOwner'):
+        response = requests.post(rpc_url, headers={'Content-Type': 'application/json'}, json=payload)
+        data = response.json()
     return {account['account']['data']['parsed']['info']['mint']: account['account']['data']['parsed']['info']['tokenAmount']['uiAmountString'] for account in data['result']['value']} if data else {}
 
 
-def compare_and_merge_data(blockchain_data, nft_data):
+def compare_and_merge_data(blockchain_data, nft_data, config):
     unknown_counter = 1  # Initialize a counter for unknown items
     merged_data = {}
 
+    # Name mints missing from the NFT data from their on-chain token metadata, resolved in batches and cached
+    unknown_mints = [mint_address for mint_address in blockchain_data if mint_address not in nft_data]
+    resolved_names = resolve_mint_names(config.node_rpc_host, unknown_mints, config.mint_name_cache_file, config.mint_name_miss_ttl) if unknown_mints else {}
+
     for mint_address, amount in blockchain_data.items():
         # Check if the mint_address exists in nft_data
         if mint_address in nft_data:
             name = nft_data[mint_address]
+        elif mint_address in resolved_names:
+            name = resolved_names[mint_address]
         else:
             name = f"Unknown Item {unknown_counter}"
             unknown_counter += 1  # Increment the counter for the next unknown item
@@ -95,8 +65,10 @@ def post_to_google_sheets(data, sheet, range_name):
     sorted_data = sorted(filtered_data.items())
     values = [[name, amount] for name, amount in sorted_data]
 
-    # Clear existing data in the specified range
-    sheet.batch_clear([range_name])
+    # Rows left over from a longer previous list are blanked in the same update instead of clearing the
+    # range first, so a planner reading ACCOUNT_RESOURCES never sees it empty or half written
+    previous_rows = len(sheet.get(range_name) or [])
+    values += [['', '']] * max(previous_rows - len(values), 0)
 
     # Update the Google Sheets worksheet with new sorted and filtered data
     if values:
@@ -114,44 +86,75 @@ def convert_nft_data_to_dict(nft_list):
     return nft_dict
 
 
-#def print_keys_of_first_item(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-        if isinstance(data, list) and len(data) > 0:
-            first_item = data[0]
-            if isinstance(first_item, dict):
-                print("Keys in the first item:", first_item.keys())
-            else:
-                print("The first item in the list is not a dictionary.")
-        else:
-            print("The JSON file does not contain a list or is empty.")
-
-# Call this function with the path to your JSON file
-#print_keys_of_first_item(GALAXY_NFTS_DATA)
-
-
-def main():
-    # Load NFT data
-    nft_data = convert_nft_data_to_dict(load_json_file(GALAXY_NFTS_DATA))
-
-    # Authenticate with Google Sheets
-    client = auth_gspread()
-    player_profile_sheet = get_worksheet(client, PLAYER_PROFILE_SHEET)
+def refresh_account_resources(client, nft_data, config):
+    """
+    Fetch the wallet's token balances, name them using nft_data (mint -> name) and publish them to
+    ACCOUNT_RESOURCES. Returns the merged name -> amount data, or None if the sheets are not accessible.
+    """
+    player_profile_sheet = get_worksheet(client, config.spreadsheet_id, config.player_profile_sheet)
+    account_resources_sheet = get_worksheet(client, config.spreadsheet_id, config.account_data_fetch_sheet)
+    if player_profile_sheet is None or account_resources_sheet is None:
+        return None
 
     # Fetch wallet address directly from cell B3
-    wallet_address = player_profile_sheet.acell(WALLET_LOOKUP_KEY).value
+    wallet_address = player_profile_sheet.acell(config.wallet_lookup_key).value
 
     # Fetch blockchain data
-    blockchain_data = fetch_blockchain_data(wallet_address)
+    blockchain_data = fetch_blockchain_data(config.node_rpc_host, wallet_address)
     #logging.info(f"Blockchain data: {blockchain_data}")
 
     # Compare and merge data
-    final_data = compare_and_merge_data(blockchain_data, nft_data)
+    final_data = compare_and_merge_data(blockchain_data, nft_data, config)
 
     # Post to Google Sheets
-    account_resources_sheet = get_worksheet(client, ACCOUNT_DATA_FETCH_SHEET)
-    post_to_google_sheets(final_data, account_resources_sheet, ACCOUNT_DATA_FETCH_RANGE)
+    post_to_google_sheets(final_data, account_resources_sheet, config.account_data_fetch_range)
     logging.info("Successfully updated Google Sheets.")
 
+    record_inventory_snapshot(config.inventory_history_db, wallet_address, blockchain_data, nft_data)
+    return final_data
+
+
+def record_inventory_snapshot(history_db, wallet_address, blockchain_data, nft_data):
+    # Keep the fetched holdings in the local history, stored as changes since the previous fetch; an empty history_db keeps none
+    if not history_db:
+        return
+    try:
+        history = InventoryHistory(history_db)
+        try:
+            _, changes = history.record_snapshot(wallet_address, blockchain_data)
+        finally:
+            history.close()
+    except Exception as e:
+        logging.warning(f"Failed to record inventory history in {history_db}: {e}")
+        return
+    for mint, (previous, amount) in sorted(changes.items(), key=lambda change: nft_data.get(change[0], change[0])):
+        logging.info(f"{nft_data.get(mint, mint)}: {previous or 0} -> {amount or 0}")
+
+
+def main():
+    init_script()
+    config = PlannerConfig.from_env()
+    planner = Planner(config)
+
+    # Load NFT data
+    nft_data = convert_nft_data_to_dict(load_nft_names(config.galaxy_nfts_data))
+
+    # Authenticate with Google Sheets
+    try:
+        client = planner.client
+    except PlannerError as e:
+        logging.error(f"{e}. Exiting.")
+        sys.exit(1)
+
+    def refresh():
+        return 'failed' if refresh_account_resources(client, nft_data, config) is None else 'updated'
+
+    # A refresh triggered while another run is writing the spreadsheet is queued behind it
+    status = planner.single_flight('profile', refresh)
+    metrics.write_textfile(config.metrics_textfile)
+    if status == 'failed':
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
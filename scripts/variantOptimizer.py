@@ -0,0 +1,90 @@
+import itertools
+import logging
+import math
+import numpy as np
+
+# Above this many combinations the groups are optimized one at a time instead of exhaustively
+MAX_VARIANT_COMBINATIONS = 4096
+
+
+def _rank_key(total_shortfall, options, graph, groups, preferred):
+    # Lowest shortfall first, then most preferred recipes, then recipe names for a stable order
+    names = tuple(graph.group_options[group][option] for group, option in zip(groups, options))
+    preference_hits = sum(1 for group, name in zip(groups, names) if preferred.get(graph.group_names[group]) == name)
+    return (int(total_shortfall), -preference_hits, names)
+
+
+def _best_of(graph, selections, groups, inventory, mint_orders, recipe_orders, preferred):
+    result = graph.net(inventory, mint_orders, recipe_orders, selections)
+    totals = result.total_shortfall()
+    ranked = sorted(
+        range(len(selections)),
+        key=lambda row: _rank_key(totals[row], selections[row, groups], graph, groups, preferred)
+    )
+    return ranked[0], int(totals[ranked[0]])
+
+
+def choose_variants(graph, requests, player_ingredients, pinned=None, preferred=None):
+    """
+    Pick one recipe per variant group (recipes sharing an output mint) so that the total raw shortfall
+    of the requested items is minimal. Pinned groups keep the player's explicit choice, ties go to the
+    preferred recipes and then to recipe names, so the same inputs always give the same plan.
+    Returns a dict of group name -> recipe name covering every variant group.
+    """
+    pinned = pinned or {}
+    preferred = preferred or {}
+    inventory = graph.mint_vector(player_ingredients)
+    mint_orders, recipe_orders = graph.order_vectors(requests)
+
+    selection = graph.default_selection()[0]
+    for group, group_name in enumerate(graph.group_names):
+        options = graph.group_options[group]
+        if group_name in pinned and pinned[group_name] not in options:
+            logging.warning(f"Preferred recipe '{pinned[group_name]}' is not a {group_name} variant, choosing automatically")
+        if pinned.get(group_name) in options:
+            selection[group] = options.index(pinned[group_name])
+        elif preferred.get(group_name) in options:
+            selection[group] = options.index(preferred[group_name])
+
+    free_groups = [
+        group for group in graph.reachable_groups(mint_orders, recipe_orders)
+        if pinned.get(graph.group_names[group]) not in graph.group_options[group]
+    ]
+    combinations = math.prod(len(graph.group_options[group]) for group in free_groups)
+
+    if free_groups and combinations <= MAX_VARIANT_COMBINATIONS:
+        # Every combination of the free groups evaluated in one batched pass
+        options = np.array(list(itertools.product(*[range(len(graph.group_options[group])) for group in free_groups])), dtype=np.int64)
+        selections = np.repeat(selection[np.newaxis, :], len(options), axis=0)
+        selections[:, free_groups] = options
+        best_row, best_total = _best_of(graph, selections, free_groups, inventory, mint_orders, recipe_orders, preferred)
+        selection = selections[best_row]
+        logging.info(f"Evaluated {len(options)} variant combinations, lowest total shortfall {best_total}")
+    elif free_groups:
+        # Too many combinations: improve one group at a time until nothing changes
+        logging.warning(f"{combinations} variant combinations exceed {MAX_VARIANT_COMBINATIONS}, optimizing groups one at a time")
+        improved = True
+        while improved:
+            improved = False
+            for group in free_groups:
+                option_count = len(graph.group_options[group])
+                selections = np.repeat(selection[np.newaxis, :], option_count, axis=0)
+                selections[:, group] = np.arange(option_count)
+                best_row, _ = _best_of(graph, selections, free_groups, inventory, mint_orders, recipe_orders, preferred)
+                if selections[best_row, group] != selection[group]:
+                    selection = selections[best_row]
+                    improved = True
+
+    choices = {graph.group_names[group]: graph.group_options[group][option] for group, option in enumerate(selection)}
+    logging.info(f"Chosen variants: {choices}")
+    return choices
+
+
+def selection_vector(graph, variant_choices):
+    # Inverse of choose_variants: option index per group for a dict of group name -> recipe name
+    selection = graph.default_selection()[0]
+    for group, group_name in enumerate(graph.group_names):
+        options = graph.group_options[group]
+        if variant_choices.get(group_name) in options:
+            selection[group] = options.index(variant_choices[group_name])
+    return selection
@@ -0,0 +1,138 @@
+import argparse
+import json
+import logging
+import numpy as np
+import pandas as pd
+from nettingEngine import NettingGraph
+from planner import Planner, PlannerConfig
+from planner.inputs import aggregate_crafting_requests, crystal_lattice_variants, framework_variants, player_variant_preferences, toolkit_variants
+from planner.script import init_script
+from variantOptimizer import choose_variants, selection_vector
+
+def _normalized_requests(requests):
+    # Same name handling as the DASHBOARD requests
+    normalized = {}
+    for item_name, quantity in requests.items():
+        item_name = item_name.strip().title()
+        normalized[item_name] = normalized.get(item_name, 0) + int(quantity)
+    return normalized
+
+
+def _apply_inventory(graph, row, quantities_by_name, add):
+    for item_name, quantity in quantities_by_name.items():
+        index = graph.mint_index.get(graph.catalog.name_to_mint.get(item_name))
+        if index is None:
+            logging.warning(f"Ignoring inventory override for unknown item '{item_name}'")
+        elif add:
+            row[index] += int(quantity)
+        else:
+            row[index] = int(quantity)
+
+
+def _apply_variants(graph, row, variants, aliases):
+    for group_name, recipe_name in variants.items():
+        recipe_name = recipe_name.strip().title()
+        recipe_name = aliases.get(recipe_name, recipe_name)
+        if group_name not in graph.group_names or recipe_name not in graph.group_options[graph.group_names.index(group_name)]:
+            logging.warning(f"Ignoring variant '{recipe_name}' for '{group_name}', it is not one of its recipes")
+            continue
+        group = graph.group_names.index(group_name)
+        row[group] = graph.group_options[group].index(recipe_name)
+
+
+def evaluate_scenarios(graph, scenarios, base_requests=None, base_inventory=None, base_variants=None, aliases=None, chunk_size=2048):
+    """
+    Net many what-if scenarios against the compiled recipe graph at once. Every scenario is a dict
+    starting from the base plan, with any of:
+      name: label used in the results (defaults to 'scenario N')
+      requests: {item: quantity} replacing the base requests, add_requests: {item: quantity} on top
+      inventory: {item: quantity} overriding the base inventory, add_inventory: {item: quantity} on top
+      variants: {variant group: recipe}, e.g. {'Crystal Lattice': 'Crystal Lattice 3'}
+    aliases maps other names for recipes, such as the PROFILE labels, to recipe names. Scenarios are
+    netted chunk_size at a time, which bounds the size of the scenario x mint matrices.
+    Returns two DataFrames: a summary with one row per scenario (total shortfall, crafts and fees)
+    and a tidy table with one row per scenario and raw item that is short.
+    """
+    aliases = aliases or {}
+    base_inventory_vector = graph.mint_vector(base_inventory or {})
+    base_mint_orders, base_recipe_orders = graph.order_vectors(_normalized_requests(base_requests or {}))
+    base_selection = selection_vector(graph, base_variants or {})
+    fees = np.array([graph.catalog.recipes[name]['fee'] for name in graph.recipe_names])
+
+    summary_rows = []
+    shortfall_rows = []
+    for chunk_start in range(0, len(scenarios), chunk_size):
+        chunk = scenarios[chunk_start:chunk_start + chunk_size]
+        inventory = np.repeat(base_inventory_vector[np.newaxis, :], len(chunk), axis=0)
+        mint_orders = np.repeat(base_mint_orders[np.newaxis, :], len(chunk), axis=0)
+        recipe_orders = np.repeat(base_recipe_orders[np.newaxis, :], len(chunk), axis=0)
+        selection = np.repeat(base_selection[np.newaxis, :], len(chunk), axis=0)
+        names = []
+
+        for row, scenario in enumerate(chunk):
+            names.append(scenario.get('name') or f"scenario {chunk_start + row + 1}")
+            if 'requests' in scenario:
+                mint_orders[row], recipe_orders[row] = graph.order_vectors(_normalized_requests(scenario['requests']))
+            if scenario.get('add_requests'):
+                extra_mint_orders, extra_recipe_orders = graph.order_vectors(_normalized_requests(scenario['add_requests']))
+                mint_orders[row] += extra_mint_orders
+                recipe_orders[row] += extra_recipe_orders
+            _apply_inventory(graph, inventory[row], scenario.get('inventory', {}), add=False)
+            _apply_inventory(graph, inventory[row], scenario.get('add_inventory', {}), add=True)
+            _apply_variants(graph, selection[row], scenario.get('variants', {}), aliases)
+
+        # One pass over the graph for the whole chunk
+        result = graph.net(inventory, mint_orders, recipe_orders, selection)
+        totals = result.total_shortfall()
+        craft_counts = result.crafts.sum(axis=1)
+        craft_fees = result.crafts @ fees
+        for row, name in enumerate(names):
+            summary_rows.append({
+                'scenario': name,
+                'total_shortfall': int(totals[row]),
+                'crafts': int(craft_counts[row]),
+                'fees': round(float(craft_fees[row]), 8)
+            })
+        for row, index in zip(*np.nonzero(result.shortfall)):
+            shortfall_rows.append({'scenario': names[row], 'item': graph.names[index], 'shortfall': int(result.shortfall[row, index])})
+
+    logging.info(f"Evaluated {len(scenarios)} what-if scenarios")
+    summary = pd.DataFrame(summary_rows, columns=['scenario', 'total_shortfall', 'crafts', 'fees'])
+    shortfalls = pd.DataFrame(shortfall_rows, columns=['scenario', 'item', 'shortfall'])
+    return summary, shortfalls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate what-if crafting scenarios against the current plan.")
+    parser.add_argument('scenarios', help="JSON file with a list of scenarios, see evaluate_scenarios")
+    parser.add_argument('--no-base', action='store_true', help="start every scenario from an empty plan instead of the player's requests and inventory")
+    parser.add_argument('--output', help="prefix for <prefix>_summary.csv and <prefix>_shortfalls.csv")
+    args = parser.parse_args()
+
+    init_script()
+    with open(args.scenarios, 'r', encoding='utf-8') as file:
+        scenarios = json.load(file)
+
+    planner = Planner(PlannerConfig.from_env())
+    graph = NettingGraph(planner.catalog)
+    aliases = {**crystal_lattice_variants, **framework_variants, **toolkit_variants}
+
+    base_requests, base_inventory, base_variants = {}, {}, {}
+    if not args.no_base:
+        # Base plan as the planner would compute it from the current inputs
+        source = planner.input_workbook(planner.client if planner.config.plan_input_source == 'sheets' else None)
+        base_inventory = planner.player_ingredients(source)
+        base_requests = aggregate_crafting_requests(planner.crafting_requests(source), {})
+        pinned, preferred = player_variant_preferences(*planner.player_preferences(source))
+        base_variants = choose_variants(graph, base_requests, base_inventory, pinned, preferred)
+
+    summary, shortfalls = evaluate_scenarios(graph, scenarios, base_requests, base_inventory, base_variants, aliases, planner.config.what_if_chunk_size)
+    print(summary.to_string(index=False))
+    if args.output:
+        summary.to_csv(f"{args.output}_summary.csv", index=False)
+        shortfalls.to_csv(f"{args.output}_shortfalls.csv", index=False)
+        logging.info(f"Wrote {args.output}_summary.csv and {args.output}_shortfalls.csv")
+
+
+if __name__ == "__main__":
+    main()